@@ -0,0 +1,218 @@
+import contextvars
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+from app.config import env_bool, env_int
+
+_MISSING = object()
+
+class TTLCache:
+    """Cache em memória, thread-safe, com expiração (TTL) e limite de itens (LRU)."""
+
+    def __init__(self, maxsize: int, ttl_seconds: float | None = None, name: str = "cache"):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple[float | None, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.RLock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: float | None = None) -> None:
+        ttl = ttl_seconds if ttl_seconds is not None else self.ttl_seconds
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any], ttl_seconds: float | None = None,
+                       should_cache: Callable[[Any], bool] = bool) -> tuple[Any, bool]:
+        """
+        Retorna (valor, veio_do_cache). Chamadas concorrentes com a mesma chave esperam
+        a primeira em vez de repetir o cálculo (single-flight), então lookups e nós
+        compartilhados entre viagens de um lote viram uma única chamada ao provedor.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value, True
+        with self._lock:
+            waiter = self._inflight.get(key)
+            owner = waiter is None
+            if owner:
+                waiter = self._inflight[key] = Future()
+        if not owner:
+            return waiter.result(), True
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            waiter.set_exception(e)
+            raise
+        if should_cache(value):
+            self.set(key, value, ttl_seconds)
+        with self._lock:
+            self._inflight.pop(key, None)
+        waiter.set_result(value)
+        return value, False
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+            return default if entry is _MISSING else entry[1]
+
+    def __contains__(self, key: Hashable) -> bool:
+        # Consulta sem afetar as estatísticas nem a ordem LRU
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            return entry is not _MISSING and (entry[0] is None or entry[0] >= time.monotonic())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else None,
+            }
+
+# --- Caches compartilhados (criados sob demanda, um por worker) ---
+
+@lru_cache(maxsize=1)
+def get_lookup_cache() -> TTLCache:
+    """Lookups determinísticos (IATA, geocoding, imagens), reaproveitados entre execuções."""
+    return TTLCache(
+        maxsize=env_int("LOOKUP_CACHE_MAX_ITEMS", 2000),
+        ttl_seconds=env_int("LOOKUP_CACHE_TTL_SECONDS", 7 * 24 * 3600),
+        name="lookups",
+    )
+
+@lru_cache(maxsize=1)
+def get_node_cache() -> TTLCache:
+    """Saídas dos nós do grafo, indexadas pelo hash dos campos do estado que cada nó lê."""
+    return TTLCache(maxsize=env_int("NODE_CACHE_MAX_ITEMS", 500), name="nodes")
+
+def cached_lookup(namespace: str):
+    """Decorator para helpers de lookup: guarda resultados não vazios no cache compartilhado."""
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args):
+            # Falhas (None / lista vazia) não são memorizadas para permitir nova tentativa
+            value, _ = get_lookup_cache().get_or_compute((namespace, *args), lambda: fn(*args))
+            return value
+        wrapper.cache_namespace = namespace
+        return wrapper
+    return decorator
+
+def _normalize_input(value: Any) -> Any:
+    # "Curitiba " e "curitiba" devem cair na mesma entrada
+    return " ".join(value.split()).lower() if isinstance(value, str) else value
+
+def hash_inputs(name: str, inputs: Dict[str, Any]) -> str:
+    inputs = {field: _normalize_input(value) for field, value in inputs.items()}
+    payload = json.dumps({"node": name, "inputs": inputs}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# Observadores dos acessos aos nós memoizados: (nome do nó, chave, veio_do_cache)
+_node_access_hooks: List[Callable[[str, str, bool], None]] = []
+
+def add_node_access_hook(hook: Callable[[str, str, bool], None]) -> None:
+    if hook not in _node_access_hooks:
+        _node_access_hooks.append(hook)
+
+# TTL mínimo das saídas de nós gravadas dentro do bloco (ver min_node_ttl)
+_min_node_ttl: contextvars.ContextVar[int | None] = contextvars.ContextVar("min_node_ttl", default=None)
+
+@contextmanager
+def min_node_ttl(seconds: int | None):
+    """
+    Garante que as saídas calculadas no bloco durem ao menos `seconds` (nunca encurta o TTL do nó).
+    Usado pelo prefetch: uma busca aquecida precisa sobreviver até o próximo ciclo.
+    """
+    token = _min_node_ttl.set(seconds)
+    try:
+        yield
+    finally:
+        _min_node_ttl.reset(token)
+
+def memoized_node(name: str, reads: Tuple[str, ...], ttl_setting: str, ttl_default: int):
+    """
+    Memoiza um nó do grafo. O nó declara os campos do estado que lê (`reads`) e sua saída
+    fica em cache sob o hash desses campos, então uma nova execução que difere apenas em
+    campos não lidos (ex: datas para as atividades) reaproveita o resultado.
+    Estados com erro e saídas com erro ou degradadas não passam pelo cache.
+    """
+    def decorator(fn: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Callable:
+        @wraps(fn)
+        def wrapper(state: Dict[str, Any]) -> Dict[str, Any]:
+            if state.get("error") or not env_bool("NODE_CACHE_ENABLED", True):
+                return fn(state)
+            key = wrapper.cache_key(state)
+            ttl = env_int(ttl_setting, ttl_default)
+            if _min_node_ttl.get():
+                ttl = max(ttl, _min_node_ttl.get())
+            result, from_cache = get_node_cache().get_or_compute(
+                key, lambda: fn(state),
+                ttl_seconds=ttl,
+                should_cache=lambda r: not r.get("error") and not r.get("degraded"),
+            )
+            if from_cache:
+                print(f"--- ♻️ Nó '{name}': reaproveitando resultado em cache ---")
+            for hook in _node_access_hooks:
+                hook(name, key, from_cache)
+            # Cada execução recebe sua própria cópia (o valor em cache é compartilhado)
+            return copy.deepcopy(result)
+        wrapper.reads = reads
+        wrapper.cache_key = lambda state: hash_inputs(name, {field: state.get(field) for field in reads})
+        return wrapper
+    return decorator
+
+@lru_cache(maxsize=1)
+def get_places_cache() -> TTLCache:
+    """Lugares do Geoapify por cidade e grupo de categorias (atividades não dependem das datas)."""
+    return TTLCache(maxsize=env_int("PLACES_CACHE_MAX_ITEMS", 1000), name="places")
+
+@lru_cache(maxsize=1)
+def get_price_cache() -> TTLCache:
+    """Preços por combinação de datas (calendário de voos); expiram rápido."""
+    return TTLCache(
+        maxsize=env_int("PRICE_CACHE_MAX_ITEMS", 5000),
+        ttl_seconds=env_int("PRICE_CACHE_TTL_SECONDS", 900),
+        name="prices",
+    )
@@ -0,0 +1,84 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, Any
+from app.config import env_bool, env_int
+from app.database import DATABASE_PATH, SessionLocal
+from app.models import PlanRun
+
+# Checkpoints duráveis do LangGraph no mesmo SQLite da aplicação.
+# Cada execução do /plan-trip é uma thread (thread_id = run_id); se um nó falhar,
+# uma nova chamada com o mesmo run_id retoma a partir do último nó concluído.
+
+# Tipos próprios que podem aparecer no estado salvo (liberados para desserialização)
+CHECKPOINT_TYPES = [
+    ("app.langgraph_app", "FinalReport"),
+    ("app.langgraph_app", "CuratedRecommendation"),
+    ("app.records", "Flight"),
+    ("app.records", "Hotel"),
+    ("app.records", "Activity"),
+]
+
+def checkpoints_enabled() -> bool:
+    return env_bool("CHECKPOINTS_ENABLED", True)
+
+@lru_cache(maxsize=1)
+def get_checkpointer():
+    """SqliteSaver compartilhado (uma conexão por worker)."""
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+    conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+    saver = SqliteSaver(conn, serde=JsonPlusSerializer(allowed_msgpack_modules=CHECKPOINT_TYPES))
+    saver.setup()
+    print(f"Checkpointer SQLite configurado em {DATABASE_PATH}")
+    return saver
+
+def run_config(run_id: str) -> Dict[str, Any]:
+    return {"configurable": {"thread_id": run_id}}
+
+def mark_run(run_id: str, status: str) -> None:
+    """Registra/atualiza a execução na tabela plan_runs (base da retenção)."""
+    if not checkpoints_enabled():
+        return
+    db = SessionLocal()
+    try:
+        run = db.get(PlanRun, run_id)
+        if run is None:
+            db.add(PlanRun(run_id=run_id, status=status))
+        else:
+            run.status = status
+        db.commit()
+    finally:
+        db.close()
+
+def cleanup_checkpoints() -> int:
+    """
+    Apaga os checkpoints das execuções expiradas (CHECKPOINT_RETENTION_HOURS) e das
+    mais antigas além de CHECKPOINT_MAX_RUNS. Retorna quantas execuções foram removidas.
+    """
+    if not checkpoints_enabled():
+        return 0
+    retention = timedelta(hours=env_int("CHECKPOINT_RETENTION_HOURS", 24))
+    max_runs = env_int("CHECKPOINT_MAX_RUNS", 500)
+    cutoff = datetime.now(timezone.utc) - retention
+
+    db = SessionLocal()
+    try:
+        expired = [r for (r,) in db.query(PlanRun.run_id).filter(PlanRun.created_at < cutoff).all()]
+        overflow = [r for (r,) in db.query(PlanRun.run_id)
+                    .filter(PlanRun.created_at >= cutoff)
+                    .order_by(PlanRun.created_at.desc())
+                    .offset(max_runs).all()]
+        to_delete = expired + overflow
+        if not to_delete:
+            return 0
+        saver = get_checkpointer()
+        for run_id in to_delete:
+            saver.delete_thread(run_id)
+        db.query(PlanRun).filter(PlanRun.run_id.in_(to_delete)).delete(synchronize_session=False)
+        db.commit()
+        print(f"Limpeza de checkpoints: {len(to_delete)} execuções removidas.")
+        return len(to_delete)
+    finally:
+        db.close()
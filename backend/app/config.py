@@ -0,0 +1,50 @@
+import os
+import threading
+from dotenv import load_dotenv
+
+# Caminho do .env na raiz do backend
+ENV_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
+
+_env_lock = threading.Lock()
+_env_loaded = False
+
+def load_env() -> None:
+    """Carrega o .env uma única vez por processo (chamado sob demanda, não no import)."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _env_lock:
+        if _env_loaded:
+            return
+        load_dotenv(dotenv_path=ENV_PATH)
+        _env_loaded = True
+        print(f".env carregado de {ENV_PATH}")
+
+# --- Helpers de leitura de configuração (sempre após carregar o .env) ---
+
+def env_str(name: str, default: str | None = None) -> str | None:
+    load_env()
+    value = os.environ.get(name)
+    return value if value not in (None, "") else default
+
+def env_int(name: str, default: int) -> int:
+    value = env_str(name)
+    try:
+        return int(value) if value is not None else default
+    except ValueError:
+        print(f"Aviso: valor inválido para {name} ({value!r}), usando {default}.")
+        return default
+
+def env_float(name: str, default: float) -> float:
+    value = env_str(name)
+    try:
+        return float(value) if value is not None else default
+    except ValueError:
+        print(f"Aviso: valor inválido para {name} ({value!r}), usando {default}.")
+        return default
+
+def env_bool(name: str, default: bool) -> bool:
+    value = env_str(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "sim", "on")
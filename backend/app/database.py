@@ -1,17 +1,47 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 # Cria o arquivo do banco de dados SQLite na raiz do backend
-SQLALCHEMY_DATABASE_URL = "sqlite:///./travel_app.db"
+# (DATABASE_URL permite apontar para outro arquivo, ex: em benchmarks)
+SQLALCHEMY_DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./travel_app.db")
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
+# Caminho do arquivo SQLite (usado também pelo checkpointer do LangGraph)
+DATABASE_PATH = engine.url.database
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+def init_db():
+    """Cria as tabelas (caso não existam). Chamado no startup da API, não no import."""
+    # Importa os modelos para registrá-los no metadata antes do create_all
+    from app import models  # noqa: F401
+    Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    # Índice FTS5 da busca de relatórios (tabela virtual, fora do metadata)
+    from app.report_search import setup_search_index
+    setup_search_index()
+
+def _add_missing_columns():
+    # create_all não altera tabelas existentes: adiciona colunas novas e anuláveis
+    # (ex: reports.origin) em bancos criados por versões anteriores.
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable or column.primary_key:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                print(f"Banco de dados: coluna {table.name}.{column.name} adicionada.")
+
 def get_db():
     db = SessionLocal()
     try:
@@ -0,0 +1,141 @@
+from dataclasses import replace
+from datetime import date, timedelta
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from app.records import Activity, Hotel
+
+# Etapa geoespacial determinística entre as buscas e o curador.
+# Com as coordenadas das atividades (Geoapify) e dos hotéis (SerpAPI), calcula distâncias
+# (haversine vetorizado em NumPy) ao centro do destino e aos hotéis, agrupa as atividades
+# por dia da viagem (k-means com inicialização fixa) e ordena cada dia por vizinho mais
+# próximo. O curador recebe esse roteiro pronto em vez de raciocinar sobre mapas em tokens.
+
+EARTH_RADIUS_KM = 6371.0088
+KMEANS_ITERATIONS = 20
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Distância em km entre pontos (graus). Aceita escalares ou arrays com broadcasting."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def pairwise_km(points_a: np.ndarray, points_b: np.ndarray) -> np.ndarray:
+    """Matriz (len(a), len(b)) de distâncias entre arrays de [lat, lon]."""
+    return haversine_km(points_a[:, None, 0], points_a[:, None, 1], points_b[None, :, 0], points_b[None, :, 1])
+
+def coordinates(items: List[Activity] | List[Hotel]) -> Tuple[list, np.ndarray]:
+    """Itens com lat/lon válidos e o array (n, 2) correspondente."""
+    located = [i for i in items if isinstance(i.lat, (int, float)) and isinstance(i.lon, (int, float))]
+    return located, np.array([[i.lat, i.lon] for i in located], dtype=float).reshape(-1, 2)
+
+def trip_days(start_date: str | None, end_date: str | None) -> List[str]:
+    """Dias com atividades: do check-in até a véspera do check-out (ao menos um)."""
+    try:
+        start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    except (TypeError, ValueError):
+        return []
+    nights = max(1, (end - start).days)
+    return [(start + timedelta(days=d)).isoformat() for d in range(nights)]
+
+def _project_km(points: np.ndarray, origin: np.ndarray) -> np.ndarray:
+    # Projeção equiretangular local: boa o bastante para agrupar dentro de uma cidade
+    lat0 = np.radians(origin[0])
+    dy = np.radians(points[:, 0] - origin[0]) * EARTH_RADIUS_KM
+    dx = np.radians(points[:, 1] - origin[1]) * EARTH_RADIUS_KM * np.cos(lat0)
+    return np.column_stack([dx, dy])
+
+def cluster_days(points: np.ndarray, center: np.ndarray, k: int) -> np.ndarray:
+    """
+    Rótulo de dia (0..k-1) para cada ponto. k-means com inicialização determinística
+    (ponto mais próximo do centro, depois sempre o mais distante dos já escolhidos),
+    então a mesma entrada produz sempre o mesmo roteiro.
+    """
+    n = len(points)
+    k = max(1, min(k, n))
+    if k == 1:
+        return np.zeros(n, dtype=int)
+    xy = _project_km(points, center)
+    seeds = [int(np.argmin(np.linalg.norm(xy, axis=1)))]
+    for _ in range(1, k):
+        nearest_seed = np.min(np.linalg.norm(xy[:, None, :] - xy[seeds][None, :, :], axis=2), axis=1)
+        seeds.append(int(np.argmax(nearest_seed)))
+    centroids = xy[seeds]
+    labels = np.zeros(n, dtype=int)
+    for _ in range(KMEANS_ITERATIONS):
+        labels = np.argmin(np.linalg.norm(xy[:, None, :] - centroids[None, :, :], axis=2), axis=1)
+        updated = np.array([xy[labels == c].mean(axis=0) if np.any(labels == c) else centroids[c] for c in range(k)])
+        if np.allclose(updated, centroids):
+            break
+        centroids = updated
+    # Dias ordenados do grupo mais central para o mais afastado
+    order = np.argsort(np.linalg.norm(centroids, axis=1), kind="stable")
+    return np.argsort(order)[labels]
+
+def _nearest_neighbor_route(distances: np.ndarray, start: int) -> List[int]:
+    route, remaining = [start], set(range(len(distances))) - {start}
+    while remaining:
+        last = route[-1]
+        route.append(min(remaining, key=lambda j: (distances[last, j], j)))
+        remaining.discard(route[-1])
+    return route
+
+def organize_activities(activities: List[Activity], hotels: List[Hotel], center: Dict[str, float] | None,
+                        start_date: str | None, end_date: str | None) -> Tuple[List[Activity], Dict[str, Any]]:
+    """
+    Retorna (atividades com features de distância, esqueleto do roteiro por dia).
+    Atividades sem coordenadas ficam em `unplaced`; as features usam km arredondados.
+    """
+    located, points = coordinates(activities)
+    located_ids = {id(item) for item in located}
+    days = trip_days(start_date, end_date)
+    skeleton: Dict[str, Any] = {"days": [], "hotels": [], "unplaced": [a.id for a in activities if id(a) not in located_ids]}
+    if not located:
+        return activities, skeleton
+
+    center_point = np.array([center["lat"], center["lon"]]) if center else points.mean(axis=0)
+    to_center = haversine_km(points[:, 0], points[:, 1], center_point[0], center_point[1])
+    hotels_located, hotel_points = coordinates(hotels)
+    to_hotels = pairwise_km(points, hotel_points) if hotels_located else None
+
+    labels = cluster_days(points, center_point, len(days) or 1)
+    features: Dict[int, Dict[str, Any]] = {}
+    for idx in range(len(located)):
+        feature = {"distance_to_center_km": round(float(to_center[idx]), 2)}
+        if to_hotels is not None:
+            nearest = int(np.argmin(to_hotels[idx]))
+            feature["nearest_hotel_id"] = hotels_located[nearest].id
+            feature["nearest_hotel_km"] = round(float(to_hotels[idx, nearest]), 2)
+        features[idx] = feature
+
+    # Grupos vazios (raros no k-means) são pulados sem deixar buracos na numeração dos dias
+    groups = [members for c in range(int(labels.max()) + 1) if len(members := np.flatnonzero(labels == c))]
+    for day, members in enumerate(groups):
+        distances = pairwise_km(points[members], points[members])
+        # Começa pela atividade mais central do grupo e segue pelo vizinho mais próximo
+        route = [int(members[i]) for i in _nearest_neighbor_route(distances, int(np.argmin(to_center[members])))]
+        legs = [float(haversine_km(*points[a], *points[b])) for a, b in zip(route, route[1:])]
+        for order, idx in enumerate(route, start=1):
+            features[idx].update({"day": day + 1, "day_order": order,
+                                  "leg_km": round(legs[order - 2], 2) if order > 1 else 0.0})
+        centroid = points[members].mean(axis=0)
+        skeleton["days"].append({
+            "day": day + 1,
+            "date": days[day] if day < len(days) else None,
+            "activity_ids": [located[i].id for i in route],
+            "activity_titles": [located[i].title for i in route],
+            "route_km": round(float(sum(legs)), 2),
+            "distance_to_center_km": round(float(haversine_km(*centroid, *center_point)), 2),
+        })
+
+    if to_hotels is not None:
+        mean_km = to_hotels.mean(axis=0)
+        to_center_hotels = haversine_km(hotel_points[:, 0], hotel_points[:, 1], center_point[0], center_point[1])
+        skeleton["hotels"] = sorted(
+            ({"id": h.id, "name": h.name, "avg_km_to_activities": round(float(mean_km[i]), 2),
+              "distance_to_center_km": round(float(to_center_hotels[i]), 2)} for i, h in enumerate(hotels_located)),
+            key=lambda h: h["avg_km_to_activities"],
+        )
+
+    by_identity = {id(item): features[idx] for idx, item in enumerate(located)}
+    enriched = [replace(item, **by_identity[id(item)]) if id(item) in by_identity else item for item in activities]
+    return enriched, skeleton
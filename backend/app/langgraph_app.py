@@ -1,46 +1,27 @@
-import os
-from dotenv import load_dotenv
-import json 
-
-# --- CARREGUE O .ENV ---
-dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
-load_dotenv(dotenv_path=dotenv_path)
-print(f".env carregado de {dotenv_path}")
-# --- FIM ---
+import json
+import threading
+import time
 
 from typing import TypedDict, Annotated, List, Dict, Any
 import operator
 import re
-from langchain_core.exceptions import OutputParserException
 
 from pydantic import BaseModel, Field as PydanticV2Field
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import PydanticOutputParser, StrOutputParser
-
-from langgraph.graph import StateGraph, END
-
-# Importar TODAS as ferramentas
-from app.tools.flight_tools import search_flights
-from app.tools.hotel_tools import search_hotels
-from app.tools.activity_tools import search_activities
-from app.tools.image_tools import search_image # <-- Importar a ferramenta de imagem (embora a usemos dentro das outras)
-
+from app.config import env_str
+from app.cache import memoized_node
+from app.llm import get_llm, warm_up_llms
+from app.records import Activity, Flight, Hotel, SearchError
+from app.resilience import ProviderUnavailable, plan_budget
 
-if 'GOOGLE_API_KEY' not in os.environ:
-    print("Erro: A variável de ambiente GOOGLE_API_KEY não foi definida.")
-else:
-    print("GOOGLE_API_KEY carregada com sucesso.")
+# As dependências pesadas (langchain_core, langchain_google_genai, langgraph, as ferramentas com
+# serpapi/tavily e o SQLAlchemy de app.checkpoints/app.llm_cache) são importadas sob demanda. Assim, importar este módulo é barato
+# e uma chave ausente não derruba o processo: o erro aparece no /ready e na rota.
 
+# Estado do aquecimento, exposto pelo endpoint de readiness
+_warmup_status: Dict[str, Any] = {"graph_ready": False, "llm_ready": False, "error": None, "warmup_seconds": None}
 
-try:
-    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", temperature=0.2, convert_system_message_to_human=True)
-    print("Modelo ChatGoogleGenerativeAI inicializado com sucesso.")
-except Exception as e:
-    print(f"Erro ao inicializar o ChatGoogleGenerativeAI: {e}")
-    exit()
+# --- LLM: um modelo por nó (tiers light/strong em app.llm, criados sob demanda) ---
 
 # --- Modelos Pydantic V2 (Definições de dados) ---
 # (Estes são os mesmos de antes, mas agora vamos usá-los no PydanticOutputParser)
@@ -52,6 +33,8 @@ class FlightDetails(BaseModel):
     duration: str = PydanticV2Field(description="Duração total do voo")
     price: str = PydanticV2Field(description="Preço total do voo")
     stops: int = PydanticV2Field(description="Número de paradas")
+    price_value: float | None = PydanticV2Field(None, description="Preço numérico em BRL (None se indisponível)")
+    duration_minutes: int | None = PydanticV2Field(None, description="Duração total em minutos")
 
 class HotelDetails(BaseModel):
     id: str = PydanticV2Field(description="Identificador único do hotel (geralmente um link)")
@@ -61,6 +44,9 @@ class HotelDetails(BaseModel):
     price: str = PydanticV2Field(description="Preço (pode ser 'Verificar no site')")
     amenities: List[str] = PydanticV2Field(description="Lista de comodidades oferecidas")
     image_url: str | None = PydanticV2Field(description="URL de uma imagem do hotel")
+    price_value: float | None = PydanticV2Field(None, description="Diária numérica em BRL (None se indisponível)")
+    rating_value: float | None = PydanticV2Field(None, description="Nota média dos hóspedes (ex: 4.5)")
+    stars: int | None = PydanticV2Field(None, description="Classificação oficial em estrelas")
 
 class ActivityDetails(BaseModel):
     id: str = PydanticV2Field(description="Identificador único da atividade (geralmente um link)")
@@ -77,6 +63,9 @@ class ExtractedInfo(BaseModel):
     start_date: str | None = PydanticV2Field(None, description="Data de início da viagem no formato AAAA-MM-DD.")
     end_date: str | None = PydanticV2Field(None, description="Data de fim da viagem no formato AAAA-MM-DD.")
 
+class BatchExtractedInfo(BaseModel):
+    trips: List[ExtractedInfo] = PydanticV2Field(description="Uma entrada por pedido, na mesma ordem dos pedidos recebidos.")
+
 # --- NOVOS MODELOS PARA A RESPOSTA CURADA ---
 
 class CuratedRecommendation(BaseModel):
@@ -92,6 +81,17 @@ class FinalReport(BaseModel):
     curated_activities: List[CuratedRecommendation] = PydanticV2Field(description="Lista de 4-5 recomendações de atividades.")
     closing_text: str = PydanticV2Field(description="Uma frase de encerramento amigável (1-2 frases).")
 
+class CuratedCategory(BaseModel):
+    """Nova seleção curada para uma única categoria (usada pelo /refine)."""
+    items: List[CuratedRecommendation] = PydanticV2Field(description="Lista de recomendações selecionadas para a categoria.")
+
+# Categoria -> (campo do FinalReport, descrição usada no prompt, quantidade sugerida)
+CURATED_CATEGORIES = {
+    "flights": ("curated_flights", "voos", "1-2"),
+    "hotels": ("curated_hotels", "hotéis", "2-3"),
+    "activities": ("curated_activities", "atividades", "4-5"),
+}
+
 # --- ESTADO DO GRAFO (ATUALIZADO) ---
 class TravelAppState(TypedDict):
     user_request: str
@@ -100,32 +100,55 @@ class TravelAppState(TypedDict):
     start_date: str | None
     end_date: str | None
     
-    # Estes agora guardam os resultados brutos das ferramentas
-    raw_flights: List[Dict] | None
-    raw_hotels: List[Dict] | None
-    raw_activities: List[Dict] | None
+    # Resultados brutos das ferramentas (registros compactos de app.records; sem linhas de erro)
+    raw_flights: List[Flight] | None
+    raw_hotels: List[Hotel] | None
+    raw_activities: List[Activity] | None
     
     # O itinerário em Markdown foi substituído por este objeto
     final_report: FinalReport | None 
     
     error: str | None
 
+    # Seções que ficaram sem dados: provedor degradado ou erro da busca (acumulativo)
+    degraded: Annotated[List[Dict], operator.add]
+
+    # Datas flexíveis: ±N dias em torno das datas pedidas e a matriz de preços consultada
+    flex_days: int | None
+    price_calendar: Dict | None
+
+    # Roteiro por dia montado pela etapa geoespacial (entregue pronto ao curador)
+    itinerary: Dict | None
+
 # --- Nó de Extração (Atualizado para o novo estado) ---
+EXTRACTION_SYSTEM_PROMPT = "Você é um assistente especialista em extrair informações de viagem de texto. Extraia a origem, o destino principal, data de início (check-in) e data de fim (check-out) do pedido do usuário. Se alguma informação não estiver clara ou ausente, retorne null para o campo correspondente. Use o formato AAAA-MM-DD para datas."
+
+EXTRACTED_FIELDS = ("origin", "destination", "start_date", "end_date")
+
 def extract_info_node(state: TravelAppState) -> dict:
     print("--- 🔍 Extraindo Informações da Requisição ---")
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import PydanticOutputParser
+    from app.llm_cache import invoke_cached
+
+    # Pedidos de um lote já chegam extraídos (uma única chamada ao LLM para todos)
+    if all(state.get(field) for field in EXTRACTED_FIELDS):
+        print("Informações já extraídas previamente; pulando o LLM.")
+        return {"error": None}
+
     user_request = state['user_request']
     parser = PydanticOutputParser(pydantic_object=ExtractedInfo)
     prompt = ChatPromptTemplate.from_messages([
-        ("system", "Você é um assistente especialista em extrair informações de viagem de texto. Extraia a origem, o destino principal, data de início (check-in) e data de fim (check-out) do pedido do usuário. Se alguma informação não estiver clara ou ausente, retorne null para o campo correspondente. Use o formato AAAA-MM-DD para datas.\n{format_instructions}"),
+        ("system", EXTRACTION_SYSTEM_PROMPT + "\n{format_instructions}"),
         ("human", "{user_request}")
     ])
-    chain = prompt | llm | parser
 
     try:
-        extracted: ExtractedInfo = chain.invoke({
+        # Pedidos que diferem só em espaços/maiúsculas reaproveitam a mesma extração
+        extracted: ExtractedInfo = invoke_cached("extraction", get_llm("extraction"), parser, prompt.invoke({
             "user_request": user_request,
             "format_instructions": parser.get_format_instructions()
-        })
+        }), normalize=True)
         print(f"Informações extraídas: Origem={extracted.origin}, Destino={extracted.destination}, Início={extracted.start_date}, Fim={extracted.end_date}")
 
         error_msg = None
@@ -145,9 +168,101 @@ def extract_info_node(state: TravelAppState) -> dict:
         # Fallback simples (pode não ser necessário se o LLM for robusto)
         return { "error": f"Não foi possível processar a extração. Erro: {e}" }
 
+def extract_batch(user_requests: List[str]) -> List[ExtractedInfo | None]:
+    """
+    Extrai origem/destino/datas de vários pedidos numa única chamada ao LLM.
+    Se a resposta não tiver uma entrada por pedido, devolve None para todos e
+    cada viagem cai na extração individual do grafo.
+    """
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import PydanticOutputParser
+    from app.llm_cache import invoke_cached
+
+    parser = PydanticOutputParser(pydantic_object=BatchExtractedInfo)
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", EXTRACTION_SYSTEM_PROMPT + " Você receberá vários pedidos numerados: retorne exatamente uma entrada em 'trips' para cada pedido, na mesma ordem.\n{format_instructions}"),
+        ("human", "{user_requests}")
+    ])
+    numbered = "\n".join(f"{i}. {request}" for i, request in enumerate(user_requests, start=1))
+
+    print(f"--- 🔍 Extraindo Informações de {len(user_requests)} pedidos (lote) ---")
+    extracted: BatchExtractedInfo = invoke_cached("extraction_batch", get_llm("extraction_batch"), parser, prompt.invoke({
+        "user_requests": numbered,
+        "format_instructions": parser.get_format_instructions()
+    }), normalize=True)
+    if len(extracted.trips) != len(user_requests):
+        print(f"Extração em lote retornou {len(extracted.trips)} entradas para {len(user_requests)} pedidos; usando extração individual.")
+        return [None] * len(user_requests)
+    return list(extracted.trips)
+
+# --- Nó de Datas Flexíveis ---
+def _nights(start: str, end: str) -> int:
+    from datetime import date
+    return (date.fromisoformat(end) - date.fromisoformat(start)).days
+
+def pick_dates_node(state: TravelAppState) -> dict:
+    """Com flex_days, consulta o calendário de preços e escolhe as datas mais baratas antes das buscas."""
+    if not state.get("flex_days") or state.get("error"):
+        return {"price_calendar": None}
+    print(f"--- 📅 Datas Flexíveis: buscando o calendário de preços (±{state['flex_days']} dias) ---")
+    from app.tools.flight_tools import search_flight_price_calendar
+
+    try:
+        calendar = search_flight_price_calendar.invoke({
+            "origin": state["origin"],
+            "destination": state["destination"],
+            "departure_date": state["start_date"],
+            "return_date": state["end_date"],
+            "flex_days": state["flex_days"],
+        })
+    except Exception as e:
+        print(f"Erro ao buscar o calendário de preços, mantendo as datas pedidas: {e}")
+        return {"price_calendar": None}
+
+    if calendar.get("error"):
+        print(f"Calendário indisponível ({calendar['error']}); mantendo as datas pedidas.")
+        return {"price_calendar": calendar}
+    cells = [
+        {"departure_date": dep, "return_date": ret, "price": price}
+        for dep, row in zip(calendar["departure_dates"], calendar["prices"])
+        for ret, price in zip(calendar["return_dates"], row)
+        if price is not None
+    ]
+    if not cells:
+        print("Calendário sem preços; mantendo as datas pedidas.")
+        return {"price_calendar": calendar}
+
+    # Prefere combinações com o mesmo número de noites do pedido original
+    nights = _nights(state["start_date"], state["end_date"])
+    same_length = [c for c in cells if _nights(c["departure_date"], c["return_date"]) == nights]
+    best = min(same_length or cells, key=lambda c: c["price"])
+    print(f"Datas escolhidas: {best['departure_date']} a {best['return_date']} (R$ {best['price']:.0f})")
+    return {
+        "start_date": best["departure_date"],
+        "end_date": best["return_date"],
+        "price_calendar": calendar,
+    }
+
 # --- Agentes de Busca (Atualizados para o novo estado) ---
+def _degraded(section: str, error: ProviderUnavailable | SearchError) -> Dict[str, str]:
+    """Marca uma seção do relatório como degradada (provedor lento/fora do ar/sem orçamento ou erro da busca)."""
+    print(f"Seção '{section}' degradada: {error}")
+    label = CURATED_CATEGORIES[section][1]
+    if isinstance(error, SearchError) and error.reason == "partial":
+        message = f"Resultados parciais de {label}: sem resposta para {error.detail}."
+    elif isinstance(error, SearchError):
+        message = f"Não foi possível consultar {label} ({error.provider}: {error.reason})."
+    else:
+        message = f"Não foi possível consultar {label} a tempo ({error.provider}: {error.reason})."
+    return {"section": section, "provider": error.provider, "reason": error.reason, "message": message}
+
+# Cada agente declara os campos do estado que lê; a saída é memoizada pelo hash
+# desses campos. Preços (voos/hotéis) expiram rápido; atividades ignoram as datas.
+@memoized_node("flights", reads=("origin", "destination", "start_date", "end_date"),
+               ttl_setting="NODE_CACHE_PRICES_TTL_SECONDS", ttl_default=900)
 def flight_agent_node(state: TravelAppState) -> dict:
     print("--- ✈️ Agente de Voos: Chamando ferramenta ---")
+    from app.tools.flight_tools import search_flights
     # ... (mesma lógica de verificação de erro) ...
     if state.get("error"):
          return {"raw_flights": [], "error": state.get("error")}
@@ -161,12 +276,17 @@ def flight_agent_node(state: TravelAppState) -> dict:
             "passengers": 1
         })
         return {"raw_flights": results} # Salva em raw_flights
+    except (ProviderUnavailable, SearchError) as e:
+        return {"raw_flights": [], "degraded": [_degraded("flights", e)]}
     except Exception as e:
         print(f"Erro ao chamar ferramenta de voos: {e}")
         return {"raw_flights": [], "error": f"Erro ao buscar voos: {e}"}
 
+@memoized_node("hotels", reads=("destination", "start_date", "end_date"),
+               ttl_setting="NODE_CACHE_PRICES_TTL_SECONDS", ttl_default=900)
 def hotel_agent_node(state: TravelAppState) -> dict:
     print("--- 🏨 Agente de Hospedagem: Chamando ferramenta ---")
+    from app.tools.hotel_tools import search_hotels
     if state.get("error"):
          return {"raw_hotels": [], "error": state.get("error")}
 
@@ -177,48 +297,81 @@ def hotel_agent_node(state: TravelAppState) -> dict:
             "check_out_date": state["end_date"]
         })
         return {"raw_hotels": results} # Salva em raw_hotels
+    except (ProviderUnavailable, SearchError) as e:
+        return {"raw_hotels": [], "degraded": [_degraded("hotels", e)]}
     except Exception as e:
         print(f"Erro ao chamar ferramenta de hotéis: {e}")
         return {"raw_hotels": [], "error": f"Erro ao buscar hotéis: {e}"}
 
 
+@memoized_node("activities", reads=("destination",),
+               ttl_setting="NODE_CACHE_ACTIVITIES_TTL_SECONDS", ttl_default=24 * 3600)
 def activity_agent_node(state: TravelAppState) -> dict:
     print("--- 🗺️ Agente de Atividades: Chamando ferramenta ---")
+    from app.tools.activity_tools import find_activities
     if state.get("error"):
          return {"raw_activities": [], "error": state.get("error")}
 
     try:
-        results = search_activities.invoke({
-            "destination": state["destination"],
-            "start_date": state["start_date"],
-            "end_date": state["end_date"]
-        })
+        results, failed_groups = find_activities(state["destination"])
+        if failed_groups:
+            # Alguns grupos de categorias falharam: mantém o que veio e marca a seção como parcial
+            partial = SearchError("geoapify_places", "partial", ", ".join(failed_groups))
+            return {"raw_activities": results, "degraded": [_degraded("activities", partial)]}
         return {"raw_activities": results} # Salva em raw_activities
+    except (ProviderUnavailable, SearchError) as e:
+        return {"raw_activities": [], "degraded": [_degraded("activities", e)]}
     except Exception as e:
         print(f"Erro ao chamar ferramenta de atividades: {e}")
         return {"raw_activities": [], "error": f"Erro ao buscar atividades: {e}"}
 
 
+# --- Nó Geoespacial (distâncias e roteiro por dia, sem LLM) ---
+def itinerary_node(state: TravelAppState) -> dict:
+    print("--- 📍 Organizando atividades por proximidade e por dia ---")
+    from app.geo import organize_activities
+    from app.tools.activity_tools import _get_city_coordinates
+
+    activities = state.get("raw_activities") or []
+    if state.get("error") or not activities:
+        return {"itinerary": None}
+
+    # Centro do destino: o geocoding já está em cache (usado pela busca de atividades)
+    center = None
+    api_key = env_str("GEOAPIFY_API_KEY")
+    if api_key and state.get("destination"):
+        try:
+            center = _get_city_coordinates(state["destination"], api_key)
+        except ProviderUnavailable:
+            center = None # sem o centro, usamos o centróide das atividades
+
+    enriched, itinerary = organize_activities(activities, state.get("raw_hotels") or [], center, state.get("start_date"), state.get("end_date"))
+    print(f"Roteiro: {len(itinerary['days'])} dia(s), {len(itinerary['unplaced'])} atividade(s) sem coordenadas.")
+    return {"raw_activities": enriched, "itinerary": itinerary}
+
+
 # --- NÓ CURADOR (TOTALMENTE REFEITO) ---
+class CurationError(RuntimeError):
+    """Falha do LLM na curadoria (parse, timeout...). A execução pode ser retomada pelo run_id."""
+
 def curate_and_report_node(state: TravelAppState) -> dict:
     print("--- 🧠 Agente Curador: Selecionando recomendações e gerando JSON ---")
+    from langchain_core.output_parsers import PydanticOutputParser
+    from app.checkpoints import checkpoints_enabled
+    from app.llm_cache import invoke_cached
+    from app.responses import dumps
 
     initial_error = state.get("error")
-    
-    # Filtra resultados que são erros
-    def filter_errors(results: List[Dict] | None) -> List[Dict]:
-        if not results:
-            return []
-        return [item for item in results if item.get("id") != "error"]
 
-    found_flights = filter_errors(state.get("raw_flights"))
-    found_hotels = filter_errors(state.get("raw_hotels"))
-    found_activities = filter_errors(state.get("raw_activities"))
+    # Erros das buscas chegam em `degraded`, então as listas só têm resultados válidos
+    found_flights = state.get("raw_flights") or []
+    found_hotels = state.get("raw_hotels") or []
+    found_activities = state.get("raw_activities") or []
 
-    # Converte os resultados limpos para JSON para enviar ao LLM
-    flights_json = json.dumps(found_flights, indent=2, ensure_ascii=False)
-    hotels_json = json.dumps(found_hotels, indent=2, ensure_ascii=False)
-    activities_json = json.dumps(found_activities, indent=2, ensure_ascii=False)
+    # Os registros são serializados uma única vez, direto para o prompt (JSON compacto)
+    flights_json = dumps(found_flights).decode()
+    hotels_json = dumps(found_hotels).decode()
+    activities_json = dumps(found_activities).decode()
 
     # Se houver um erro de extração e NENHUMA ferramenta retornou dados, encerra
     if initial_error and not found_flights and not found_hotels and not found_activities:
@@ -228,6 +381,25 @@ def curate_and_report_node(state: TravelAppState) -> dict:
             "error": initial_error
          }
 
+    # Seções degradadas: o curador deve avisar em vez de inventar dados
+    # (resultados parciais continuam na lista e são curados normalmente)
+    degraded_sections = [CURATED_CATEGORIES[d["section"]][1] for d in state.get("degraded") or [] if d["reason"] != "partial"]
+    degraded_note = ""
+    if degraded_sections:
+        degraded_note = (f"ATENÇÃO: as buscas de {', '.join(degraded_sections)} estão temporariamente indisponíveis. "
+                         "Retorne lista vazia para elas e mencione isso brevemente no resumo.\n")
+
+    # Roteiro pré-organizado pela etapa geoespacial (grupos por dia e distâncias já calculados)
+    itinerary_note = ""
+    if state.get("itinerary") and state["itinerary"].get("days"):
+        itinerary_json = dumps(state["itinerary"]).decode()
+        itinerary_note = f"""
+    --- ROTEIRO PRÉ-ORGANIZADO (atividades agrupadas por dia e por proximidade) ---
+    {itinerary_json}
+    Use este roteiro: prefira atividades de dias diferentes, hotéis com menor avg_km_to_activities
+    e cite o dia sugerido na justificativa. Não recalcule distâncias.
+    """
+
     # Define o parser de saída para o nosso novo modelo FinalReport
     parser = PydanticOutputParser(pydantic_object=FinalReport)
 
@@ -242,11 +414,12 @@ def curate_and_report_node(state: TravelAppState) -> dict:
     Informações da Viagem:
     Destino: {state.get('destination', 'Não extraído')}
     Período: {state.get('start_date', 'Não extraído')} a {state.get('end_date', 'Não extraído')}
-
+    {degraded_note}
     --- DADOS BRUTOS DAS FERRAMENTAS ---
     Voos: {flights_json}
     Hotéis: {hotels_json}
     Atividades: {activities_json}
+    {itinerary_note}
 
     --- SUA TAREFA ---
     Analise as listas JSON acima. Selecione as MELHORES opções (1-2 voos, 2-3 hotéis, 4-5 atividades)
@@ -260,10 +433,10 @@ def curate_and_report_node(state: TravelAppState) -> dict:
 
     print("--- 🤖 Gerando relatório JSON curado com o Gemini... ---")
 
-    chain = llm | parser
 
     try:
-        report: FinalReport = chain.invoke(summary_prompt)
+        # Mesmo pedido e mesmos candidatos -> mesma curadoria (cache persistente do LLM)
+        report: FinalReport = invoke_cached("curation", get_llm("curation"), parser, summary_prompt)
         
         # Retorna o objeto Pydantic
         return {
@@ -272,30 +445,162 @@ def curate_and_report_node(state: TravelAppState) -> dict:
         }
     except Exception as e:
         print(f"!!! Erro crítico ao gerar relatório JSON curado: {e}")
-        return {
-            "final_report": None,
-            "error": f"Erro do Agente Curador: {e}"
-        }
+        if not checkpoints_enabled():
+            # Sem checkpoint não há como retomar: devolve o erro no estado (as buscas
+            # continuam disponíveis para o /refine pelo run_id)
+            return {"final_report": None, "error": f"Erro do Agente Curador: {e}"}
+        # Propaga a falha: com o checkpointer, os nós anteriores já ficaram salvos
+        # e uma nova tentativa com o mesmo run_id retoma a partir daqui.
+        raise CurationError(f"Erro do Agente Curador: {e}") from e
+
+
+# --- Re-curadoria de uma única categoria (usada pelo /refine) ---
+def recurate_category(state: Dict[str, Any], category: str, items: List[Any]) -> List[CuratedRecommendation]:
+    """Pede ao LLM uma nova seleção apenas para a categoria alterada, sem refazer o grafo."""
+    from langchain_core.output_parsers import PydanticOutputParser
+    from app.responses import dumps
+
+    if not items:
+        return []
+    _, label, amount = CURATED_CATEGORIES[category]
+    parser = PydanticOutputParser(pydantic_object=CuratedCategory)
+    items_json = dumps(items).decode()
+
+    prompt = f"""
+    Você é um agente de viagens especialista. O usuário refinou a busca de {label}
+    e você deve refazer APENAS a seleção desta categoria.
 
+    O pedido original do usuário foi:
+    "{state.get('user_request')}"
 
-# --- Definição do Grafo (ATUALIZADO) ---
-print("Construindo o gráfico de agentes LangGraph...")
-workflow = StateGraph(TravelAppState)
-workflow.add_node("extract_info", extract_info_node)
-workflow.add_node("flights", flight_agent_node)
-workflow.add_node("hotels", hotel_agent_node)
-workflow.add_node("activities", activity_agent_node)
-workflow.add_node("curate_and_report", curate_and_report_node) 
+    Destino: {state.get('destination', 'Não extraído')}
+    Período: {state.get('start_date', 'Não extraído')} a {state.get('end_date', 'Não extraído')}
+
+    --- {label.upper()} DISPONÍVEIS (JÁ FILTRADOS) ---
+    {items_json}
+
+    Selecione as MELHORES opções ({amount} {label}) e justifique cada escolha (1-2 frases).
+    Gere um objeto JSON que siga estritamente o formato abaixo.
+    {parser.get_format_instructions()}
+    """
 
-workflow.set_entry_point("extract_info")
-workflow.add_edge("extract_info", "flights")
-workflow.add_edge("flights", "hotels")
-workflow.add_edge("hotels", "activities")
-workflow.add_edge("activities", "curate_and_report")
-workflow.add_edge("curate_and_report", END)
+    print(f"--- 🤖 Re-curando apenas '{category}' com o Gemini... ---")
+    curated: CuratedCategory = parser.invoke(get_llm("recuration").invoke(prompt))
+    return curated.items
+
+
+# --- Definição do Grafo (compilado sob demanda, uma vez por worker) ---
+def build_graph():
+    """Monta e compila o grafo de agentes LangGraph."""
+    from langgraph.graph import StateGraph, END
+
+    print("Construindo o gráfico de agentes LangGraph...")
+    workflow = StateGraph(TravelAppState)
+    workflow.add_node("extract_info", extract_info_node)
+    workflow.add_node("pick_dates", pick_dates_node)
+    workflow.add_node("flights", flight_agent_node)
+    workflow.add_node("hotels", hotel_agent_node)
+    workflow.add_node("activities", activity_agent_node)
+    workflow.add_node("itinerary", itinerary_node)
+    workflow.add_node("curate_and_report", curate_and_report_node) 
+
+    workflow.set_entry_point("extract_info")
+    workflow.add_edge("extract_info", "pick_dates")
+    workflow.add_edge("pick_dates", "flights")
+    workflow.add_edge("flights", "hotels")
+    workflow.add_edge("hotels", "activities")
+    workflow.add_edge("activities", "itinerary")
+    workflow.add_edge("itinerary", "curate_and_report")
+    workflow.add_edge("curate_and_report", END)
+
+    from app.checkpoints import checkpoints_enabled, get_checkpointer
+
+    checkpointer = None
+    if checkpoints_enabled():
+        checkpointer = get_checkpointer()
+    compiled = workflow.compile(checkpointer=checkpointer)
+    print("Gráfico compilado com sucesso.")
+    return compiled
+
+_app = None
+_app_lock = threading.Lock()
+
+def get_app():
+    """Retorna o grafo compilado compartilhado, compilando-o na primeira chamada."""
+    global _app
+    if _app is not None:
+        return _app
+    with _app_lock:
+        if _app is None:
+            _app = build_graph()
+            _warmup_status["graph_ready"] = True
+    return _app
+
+def run_plan(initial_state: TravelAppState, run_id: str) -> Dict[str, Any]:
+    """
+    Executa o grafo para o run_id. Se já existir um checkpoint incompleto para ele
+    (ex: o curador falhou), retoma do último nó concluído em vez de recomeçar;
+    se a execução já terminou, devolve o estado final salvo.
+    """
+    from app.checkpoints import checkpoints_enabled, run_config, mark_run
+
+    graph = get_app()
+    if not checkpoints_enabled():
+        with plan_budget():
+            return graph.invoke(initial_state)
+
+    config = run_config(run_id)
+    snapshot = graph.get_state(config)
+    if snapshot.values and not snapshot.next:
+        print(f"Execução {run_id} já concluída; devolvendo o estado salvo.")
+        return snapshot.values
+    resume = bool(snapshot.values and snapshot.next)
+    if resume:
+        print(f"Retomando a execução {run_id} a partir de: {', '.join(snapshot.next)}")
+
+    mark_run(run_id, "running")
+    try:
+        with plan_budget():
+            result = graph.invoke(None if resume else initial_state, config)
+    except Exception:
+        mark_run(run_id, "failed")
+        raise
+    mark_run(run_id, "completed")
+    return result
+
+def load_checkpoint_state(run_id: str) -> Dict[str, Any] | None:
+    """Último estado salvo no checkpoint de uma execução (None se não existir)."""
+    from app.checkpoints import checkpoints_enabled, run_config
+    if not checkpoints_enabled():
+        return None
+    snapshot = get_app().get_state(run_config(run_id))
+    return dict(snapshot.values) if snapshot.values else None
+
+def is_resumable(run_id: str) -> bool:
+    """True se a execução tem checkpoint e ainda há nós pendentes."""
+    from app.checkpoints import checkpoints_enabled, run_config
+    if not checkpoints_enabled():
+        return False
+    snapshot = get_app().get_state(run_config(run_id))
+    return bool(snapshot.values and snapshot.next)
+
+def warm_up() -> Dict[str, Any]:
+    """Pré-aquece o grafo e o LLM (chamado no lifespan da API). Nunca lança exceção."""
+    start = time.perf_counter()
+    try:
+        get_app()
+        warm_up_llms()
+        _warmup_status["llm_ready"] = True
+        _warmup_status["error"] = None
+    except Exception as e:
+        print(f"Erro ao pré-aquecer o grafo/LLM: {e}")
+        _warmup_status["error"] = str(e)
+    _warmup_status["warmup_seconds"] = round(time.perf_counter() - start, 3)
+    return warmup_status()
 
-app = workflow.compile()
-print("Gráfico compilado com sucesso.")
+def warmup_status() -> Dict[str, Any]:
+    """Estado atual do aquecimento (usado pelo endpoint de readiness)."""
+    return dict(_warmup_status)
 
 # --- Execução __main__ (para teste) ---
 if __name__ == "__main__":
@@ -309,11 +614,18 @@ if __name__ == "__main__":
         start_date= None, end_date= None, 
         raw_flights= None, raw_hotels= None, raw_activities= None, 
         final_report= None, 
-        error= None 
+        error= None,
+        degraded= [],
+        flex_days= None,
+        price_calendar= None,
+        itinerary= None
     )
     
     try:
-        final_response_state = app.invoke(initial_state)
+        import uuid
+        from app.database import init_db
+        init_db()
+        final_response_state = run_plan(initial_state, run_id=f"cli-{uuid.uuid4().hex}")
         print("\n--- Planejamento Concluído! ---")
         print("\n" + "="*50)
         print("             RELATÓRIO FINAL GERADO (JSON)")
@@ -0,0 +1,268 @@
+import contextvars
+import json
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from functools import lru_cache
+from typing import Any, Callable, Dict, NamedTuple
+from app.config import env_bool, env_float, env_int, env_str
+
+# Modelos por nó do grafo, em dois níveis ("tiers"):
+# - light: extração de origem/destino/datas (rápido e barato);
+# - strong: curadoria do relatório.
+# Cada nó aponta para um tier (LLM_TIER_<NÓ>) e cada tier tem modelo, temperatura, prazo e
+# limite de tokens próprios (LLM_<TIER>_*), então latência e custo de cada nó são ajustados
+# pelo .env. Se o tier do nó estourar o prazo, a chamada é refeita no outro tier.
+# LLM_BACKEND=stub troca o Gemini por um backend local determinístico (testes e benchmarks).
+
+class TierConfig(NamedTuple):
+    model: str
+    temperature: float
+    timeout_seconds: float
+    max_output_tokens: int | None
+    thinking_budget: int | None
+
+# Tier -> (modelo, temperatura, prazo em segundos) padrão
+TIERS = {
+    "light": ("gemini-2.5-flash-lite", 0.0, 20.0),
+    "strong": ("gemini-2.5-flash", 0.2, 60.0),
+}
+
+# Ponto de chamada -> tier padrão
+NODE_TIERS = {
+    "extraction": "light",
+    "extraction_batch": "light",
+    "curation": "strong",
+    "recuration": "strong",
+}
+
+class LLMTimeout(TimeoutError):
+    """O modelo não respondeu dentro do prazo do tier."""
+
+def tier_config(tier: str) -> TierConfig:
+    model, temperature, timeout = TIERS[tier]
+    prefix = f"LLM_{tier.upper()}_"
+    max_tokens = env_int(prefix + "MAX_OUTPUT_TOKENS", 0)
+    thinking = env_str(prefix + "THINKING_BUDGET")
+    return TierConfig(
+        model=env_str(prefix + "MODEL", model),
+        temperature=env_float(prefix + "TEMPERATURE", temperature),
+        timeout_seconds=env_float(prefix + "TIMEOUT_SECONDS", timeout),
+        max_output_tokens=max_tokens or None,
+        thinking_budget=int(thinking) if thinking is not None else None,
+    )
+
+def node_tier(node: str) -> str:
+    tier = (env_str(f"LLM_TIER_{node.upper()}") or NODE_TIERS[node]).lower()
+    if tier not in TIERS:
+        raise ValueError(f"Tier de LLM desconhecido para '{node}': {tier} (opções: {', '.join(TIERS)})")
+    return tier
+
+# --- Backends ---
+
+def _gemini_backend(config: TierConfig):
+    if not env_str("GOOGLE_API_KEY"):
+        raise RuntimeError("A variável de ambiente GOOGLE_API_KEY não foi definida.")
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    options: Dict[str, Any] = {}
+    if config.max_output_tokens:
+        options["max_output_tokens"] = config.max_output_tokens
+    if config.thinking_budget is not None:
+        options["thinking_budget"] = config.thinking_budget
+    return ChatGoogleGenerativeAI(
+        model=config.model, temperature=config.temperature, timeout=config.timeout_seconds,
+        max_retries=env_int("LLM_MAX_RETRIES", 1), convert_system_message_to_human=True, **options,
+    )
+
+def _stub_backend(config: TierConfig):
+    return StubChatModel(f"stub/{config.model}", config.temperature, env_float("LLM_STUB_LATENCY_SECONDS", 0.0))
+
+_BACKENDS: Dict[str, Callable[[TierConfig], Any]] = {
+    "gemini": _gemini_backend,
+    "stub": _stub_backend,
+}
+
+def register_backend(name: str, factory: Callable[[TierConfig], Any]) -> None:
+    """Registra um backend (factory(TierConfig) -> objeto com .invoke(prompt) que retorna uma mensagem)."""
+    _BACKENDS[name] = factory
+    get_client.cache_clear()
+
+def llm_backend() -> str:
+    return env_str("LLM_BACKEND", "gemini").lower()
+
+@lru_cache(maxsize=None)
+def get_client(backend: str, tier: str):
+    """Cliente do tier (criado uma vez por worker)."""
+    if backend not in _BACKENDS:
+        raise ValueError(f"Backend de LLM desconhecido: {backend} (opções: {', '.join(_BACKENDS)})")
+    config = tier_config(tier)
+    client = _BACKENDS[backend](config)
+    print(f"LLM '{tier}' inicializado ({backend}: {config.model}).")
+    return client
+
+# --- Execução com prazo e fallback entre tiers ---
+
+@lru_cache(maxsize=1)
+def _get_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=env_int("LLM_MAX_WORKERS", 8), thread_name_prefix="llm")
+
+_stats: Dict[str, Counter] = {}
+_stats_lock = threading.Lock()
+
+def _record(node: str, **values: float) -> None:
+    with _stats_lock:
+        _stats.setdefault(node, Counter()).update(values)
+
+def _is_timeout(error: BaseException) -> bool:
+    # TimeoutError, httpx.ReadTimeout, google.api_core DeadlineExceeded...
+    name = type(error).__name__.lower()
+    return isinstance(error, TimeoutError) or "timeout" in name or "deadline" in name
+
+def _invoke_tier(node: str, tier: str, prompt: Any) -> Any:
+    config = tier_config(tier)
+    client = get_client(llm_backend(), tier)
+    start = time.perf_counter()
+    future = _get_executor().submit(contextvars.copy_context().run, client.invoke, prompt)
+    try:
+        message = future.result(timeout=config.timeout_seconds)
+    except FuturesTimeout:
+        future.cancel()
+        raise LLMTimeout(f"{config.model} excedeu {config.timeout_seconds:g}s ({node})")
+    usage = getattr(message, "usage_metadata", None) or {}
+    _record(node, calls=1, **{f"{tier}_calls": 1}, latency_ms=(time.perf_counter() - start) * 1000,
+            input_tokens=usage.get("input_tokens", 0), output_tokens=usage.get("output_tokens", 0))
+    return message
+
+class TieredLLM:
+    """LLM de um nó: usa o tier configurado e, em timeout, tenta o outro tier uma vez."""
+
+    def __init__(self, node: str):
+        self.node = node
+        self.tier = node_tier(node)
+        config = tier_config(self.tier)
+        # Lidos pelo cache persistente (app.llm_cache) para compor a chave
+        self.model = config.model
+        self.temperature = config.temperature
+
+    def invoke(self, prompt: Any) -> Any:
+        try:
+            return _invoke_tier(self.node, self.tier, prompt)
+        except Exception as e:
+            if not _is_timeout(e) or not env_bool("LLM_FALLBACK_ENABLED", True):
+                raise
+            fallback = next(t for t in TIERS if t != self.tier)
+            print(f"LLM: '{self.node}' excedeu o prazo no tier '{self.tier}' ({e}); tentando '{fallback}'.")
+            _record(self.node, timeouts=1, fallbacks=1)
+            message = _invoke_tier(self.node, fallback, prompt)
+            # Marca a resposta: veio de outro modelo que o da chave do cache (app.llm_cache não a grava)
+            metadata = getattr(message, "response_metadata", None)
+            if isinstance(metadata, dict):
+                metadata["fallback_tier"] = fallback
+            return message
+
+def fallback_tier(message: Any) -> str | None:
+    """Tier que respondeu no lugar do configurado (None se a resposta veio do tier do nó)."""
+    return (getattr(message, "response_metadata", None) or {}).get("fallback_tier")
+
+def get_llm(node: str = "curation") -> TieredLLM:
+    return TieredLLM(node)
+
+def warm_up_llms() -> None:
+    """Cria os clientes dos tiers usados pelos nós (lança exceção se faltar configuração)."""
+    for tier in sorted({node_tier(node) for node in NODE_TIERS}):
+        get_client(llm_backend(), tier)
+
+def llm_stats() -> Dict[str, Any]:
+    """Configuração e métricas por nó (chamadas, latência média, tokens, fallbacks)."""
+    with _stats_lock:
+        stats = {node: dict(counter) for node, counter in _stats.items()}
+    nodes = {}
+    for node in NODE_TIERS:
+        counter = stats.get(node, {})
+        calls = counter.get("calls", 0)
+        nodes[node] = {
+            "tier": node_tier(node),
+            "model": tier_config(node_tier(node)).model,
+            "calls": calls,
+            "fallbacks": counter.get("fallbacks", 0),
+            "avg_latency_ms": round(counter.get("latency_ms", 0) / calls, 1) if calls else None,
+            "input_tokens": counter.get("input_tokens", 0),
+            "output_tokens": counter.get("output_tokens", 0),
+        }
+    return {"backend": llm_backend(), "tiers": {t: tier_config(t)._asdict() for t in TIERS}, "nodes": nodes}
+
+# --- Backend local (stub) ---
+
+_DATE = r"\d{4}-\d{2}-\d{2}"
+_TRIP_RE = re.compile(
+    rf"\bde\s+(?P<origin>.+?)\s+para\s+(?P<destination>.+?)\s+(?:de|entre|em|no período de)\s+"
+    rf"(?P<start>{_DATE})\s+(?:até|a|e)\s+(?P<end>{_DATE})", re.IGNORECASE,
+)
+
+def _stub_extract(request: str) -> Dict[str, Any]:
+    match = _TRIP_RE.search(request)
+    if not match:
+        return {"origin": None, "destination": None, "start_date": None, "end_date": None}
+    return {"origin": match["origin"].strip(), "destination": match["destination"].strip(),
+            "start_date": match["start"], "end_date": match["end"]}
+
+def _json_list_after(text: str, marker: str) -> list:
+    position = text.find(marker)
+    start = text.find("[", position) if position >= 0 else -1
+    if start < 0:
+        return []
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text, start)
+    except ValueError:
+        return []
+    return value if isinstance(value, list) else []
+
+def _stub_pick(items: list, amount: int) -> list:
+    return [{"data": item, "justification": "Selecionado automaticamente (backend stub)."} for item in items[:amount]]
+
+def default_stub_response(prompt: str) -> str:
+    """Resposta determinística conforme o formato pedido no prompt (extração, lote ou curadoria)."""
+    # Só o schema pedido importa (o exemplo das format_instructions também cita "items")
+    schema = prompt.split("Here is the output schema:")[-1].split("Human:")[0]
+    if '"trips"' in schema:
+        requests = re.findall(r"^\s*\d+\.\s+(.+)$", prompt.split("Human:")[-1], re.MULTILINE)
+        return json.dumps({"trips": [_stub_extract(r) for r in requests]}, ensure_ascii=False)
+    if '"summary_text"' in schema:
+        return json.dumps({
+            "summary_text": "Relatório gerado pelo backend stub.",
+            "curated_flights": _stub_pick(_json_list_after(prompt, "Voos:"), 2),
+            "curated_hotels": _stub_pick(_json_list_after(prompt, "Hotéis:"), 3),
+            "curated_activities": _stub_pick(_json_list_after(prompt, "Atividades:"), 5),
+            "closing_text": "Boa viagem!",
+        }, ensure_ascii=False)
+    if '"items"' in schema:
+        return json.dumps({"items": _stub_pick(_json_list_after(prompt, "DISPONÍVEIS"), 3)}, ensure_ascii=False)
+    return json.dumps(_stub_extract(prompt.split("Human:")[-1]), ensure_ascii=False)
+
+_stub_handler: Callable[[str], str] = default_stub_response
+
+def set_stub_handler(handler: Callable[[str], str] | None) -> None:
+    """Troca a função que gera as respostas do stub (None volta ao padrão)."""
+    global _stub_handler
+    _stub_handler = handler or default_stub_response
+
+class StubChatModel:
+    """Modelo local sem rede: responde com `_stub_handler(prompt)` e contabiliza tokens aproximados."""
+
+    def __init__(self, model: str, temperature: float, latency_seconds: float = 0.0):
+        self.model = model
+        self.temperature = temperature
+        self.latency_seconds = latency_seconds
+
+    def invoke(self, prompt: Any) -> Any:
+        from langchain_core.messages import AIMessage
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        text = prompt.to_string() if hasattr(prompt, "to_string") else str(prompt)
+        content = _stub_handler(text)
+        input_tokens, output_tokens = len(text) // 4, len(content) // 4
+        return AIMessage(content=content, usage_metadata={
+            "input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens,
+        })
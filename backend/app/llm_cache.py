@@ -0,0 +1,177 @@
+import contextvars
+import hashlib
+import json
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict
+from sqlalchemy import func
+from app.config import env_bool, env_int
+from app.database import SessionLocal
+from app.llm import fallback_tier
+from app.models import LLMCacheEntry
+
+# Cache persistente (SQLite) das respostas do LLM.
+# Pedidos idênticos (ou que diferem só em espaços/maiúsculas, na extração) e curadorias
+# sobre exatamente o mesmo conjunto de candidatos reaproveitam a resposta salva em vez
+# de chamar o Gemini de novo. Guardamos o texto bruto da resposta e o parser roda sempre,
+# então uma entrada que não passe mais na validação é descartada e recalculada.
+
+# Ponto de chamada -> TTL padrão em segundos (sobrescrito por LLM_CACHE_TTL_<PONTO>)
+CALL_SITES = {
+    "extraction": 30 * 24 * 3600,
+    "extraction_batch": 30 * 24 * 3600,
+    "curation": 24 * 3600,
+}
+
+# Ignora as entradas salvas (a resposta nova ainda é gravada) durante um pedido
+_bypass: contextvars.ContextVar[bool] = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+@contextmanager
+def llm_cache_bypass(enabled: bool = True):
+    token = _bypass.set(enabled)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+def llm_cache_enabled() -> bool:
+    return env_bool("LLM_CACHE_ENABLED", True)
+
+def call_site_ttl(call_site: str) -> int:
+    return env_int(f"LLM_CACHE_TTL_{call_site.upper()}", CALL_SITES[call_site])
+
+# --- Métricas por ponto de chamada (por worker) ---
+_stats: Dict[str, Counter] = {site: Counter() for site in CALL_SITES}
+_stats_lock = threading.Lock()
+
+def _count(call_site: str, event: str) -> None:
+    with _stats_lock:
+        _stats[call_site][event] += 1
+
+def _prompt_text(prompt: Any) -> str:
+    # ChatPromptValue/StringPromptValue (to_string) ou o prompt já em texto
+    return prompt.to_string() if hasattr(prompt, "to_string") else str(prompt)
+
+def cache_key(call_site: str, llm: Any, prompt: Any, format_instructions: str, normalize: bool = False) -> str:
+    text = _prompt_text(prompt)
+    if normalize:
+        # "Planeje  uma viagem..." e "planeje uma viagem..." caem na mesma entrada
+        text = " ".join(text.split()).lower()
+    payload = json.dumps({
+        "call_site": call_site,
+        "model": getattr(llm, "model", None) or getattr(llm, "model_name", None) or type(llm).__name__,
+        "temperature": getattr(llm, "temperature", None),
+        "prompt": text,
+        "format_instructions": format_instructions,
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _load(key: str) -> str | None:
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+    try:
+        entry = db.query(LLMCacheEntry).filter(LLMCacheEntry.key == key, LLMCacheEntry.expires_at > now).first()
+        if entry is None:
+            return None
+        entry.hits = (entry.hits or 0) + 1
+        entry.last_used_at = now
+        db.commit()
+        return entry.response
+    finally:
+        db.close()
+
+def _store(key: str, call_site: str, model: str | None, response: str) -> None:
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+    try:
+        db.merge(LLMCacheEntry(
+            key=key, call_site=call_site, model=model, response=response, hits=0,
+            created_at=now, last_used_at=now, expires_at=now + timedelta(seconds=call_site_ttl(call_site)),
+        ))
+        db.flush()
+        # Expiradas saem primeiro; acima do limite, as menos usadas recentemente (LRU)
+        db.query(LLMCacheEntry).filter(LLMCacheEntry.expires_at <= now).delete(synchronize_session=False)
+        overflow = db.query(func.count(LLMCacheEntry.key)).scalar() - env_int("LLM_CACHE_MAX_ENTRIES", 5000)
+        if overflow > 0:
+            oldest = db.query(LLMCacheEntry.key).order_by(LLMCacheEntry.last_used_at).limit(overflow).subquery()
+            db.query(LLMCacheEntry).filter(LLMCacheEntry.key.in_(oldest.select())).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def _discard(key: str) -> None:
+    db = SessionLocal()
+    try:
+        db.query(LLMCacheEntry).filter(LLMCacheEntry.key == key).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def invoke_cached(call_site: str, llm: Any, parser: Any, prompt: Any, normalize: bool = False) -> Any:
+    """
+    Equivale a `parser.invoke(llm.invoke(prompt))`, com a resposta do LLM em cache.
+    `normalize` ignora diferenças de espaços e maiúsculas no prompt (só para a chave).
+    """
+    if not llm_cache_enabled():
+        return parser.invoke(llm.invoke(prompt))
+
+    key = cache_key(call_site, llm, prompt, parser.get_format_instructions(), normalize)
+    if _bypass.get():
+        _count(call_site, "bypassed")
+    else:
+        try:
+            cached = _load(key)
+        except Exception as e:
+            print(f"Cache do LLM indisponível ({call_site}): {e}")
+            cached = None
+        if cached is not None:
+            try:
+                result = parser.invoke(cached)
+                _count(call_site, "hits")
+                print(f"--- ♻️ Cache do LLM: reaproveitando resposta ({call_site}) ---")
+                return result
+            except Exception:
+                # Formato mudou ou resposta inválida: descarta e chama o LLM de novo
+                _discard(key)
+        _count(call_site, "misses")
+
+    message = llm.invoke(prompt)
+    result = parser.invoke(message) # só guardamos respostas que passaram no parser
+    content = getattr(message, "content", message)
+    if fallback_tier(message):
+        # Resposta do tier de fallback (timeout do configurado): a chave é do modelo configurado,
+        # então gravá-la serviria a resposta do outro modelo por todo o TTL
+        _count(call_site, "fallback_not_stored")
+        print(f"Cache do LLM: resposta do tier '{fallback_tier(message)}' não gravada ({call_site}).")
+    elif isinstance(content, str):
+        try:
+            _store(key, call_site, getattr(llm, "model", None), content)
+        except Exception as e:
+            print(f"Falha ao gravar no cache do LLM ({call_site}): {e}")
+    return result
+
+def llm_cache_stats() -> Dict[str, Any]:
+    """Acertos por ponto de chamada (desde o início do worker) e entradas persistidas."""
+    with _stats_lock:
+        by_site = {}
+        for site, counter in _stats.items():
+            lookups = counter["hits"] + counter["misses"]
+            by_site[site] = {
+                "hits": counter["hits"], "misses": counter["misses"], "bypassed": counter["bypassed"],
+                "fallback_not_stored": counter["fallback_not_stored"],
+                "hit_rate": round(counter["hits"] / lookups, 3) if lookups else None,
+            }
+    db = SessionLocal()
+    try:
+        entries = dict(db.query(LLMCacheEntry.call_site, func.count(LLMCacheEntry.key))
+                       .group_by(LLMCacheEntry.call_site).all())
+    finally:
+        db.close()
+    return {
+        "enabled": llm_cache_enabled(),
+        "max_entries": env_int("LLM_CACHE_MAX_ENTRIES", 5000),
+        "call_sites": {site: {**by_site[site], "entries": entries.get(site, 0), "ttl_seconds": call_site_ttl(site)}
+                       for site in CALL_SITES},
+    }
@@ -1,35 +1,109 @@
-from fastapi import FastAPI, HTTPException, Request, Depends, status
+from fastapi import FastAPI, HTTPException, Request, Depends, Query, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from pydantic import BaseModel, Field
-from typing import List, Dict, Any
+from contextlib import asynccontextmanager
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import List, Dict, Any, Literal
+from datetime import date
+import asyncio
 import time
 import os
+import uuid
 
 # --- Importações do LangGraph (Originais) ---
-# Certifique-se de que o langgraph_app.py está correto e no mesmo diretório
-from app.langgraph_app import app as langgraph_app, TravelAppState, FinalReport, CuratedRecommendation
+# O grafo e o LLM são construídos sob demanda (get_app) ou no lifespan (warm_up)
+from app.langgraph_app import run_plan, is_resumable, load_checkpoint_state, warm_up, warmup_status, recurate_category, extract_batch, CURATED_CATEGORIES, ExtractedInfo, TravelAppState, FinalReport, CuratedRecommendation
+from app.run_store import save_run, load_run
+from app.refine import refine_items
+from app.records import Activity, Flight, Hotel, ensure_records
+from app.report_export import export_reports
+from app.report_search import search_reports, search_available
 
 # --- Novas Importações para Banco de Dados e Auth ---
 from sqlalchemy.orm import Session
-from app.database import engine, Base, get_db
+from app.database import init_db, get_db
+from app.checkpoints import cleanup_checkpoints
+from app.config import env_bool, env_int
+from app.prefetch import get_prefetcher
+from app.llm import llm_stats
+from app.llm_cache import llm_cache_bypass, llm_cache_stats
+from app.resilience import ProviderUnavailable, plan_budget, resilience_status
+from app.responses import FastJSONResponse, CompressionMiddleware, dumps
 from app.models import User, Report
 from app.auth import get_password_hash, verify_password, create_access_token, get_current_user
 
-# Cria as tabelas no banco de dados (caso não existam)
-Base.metadata.create_all(bind=engine)
-
 # --- Modelos Pydantic para a API ---
 
 class TripRequest(BaseModel):
     user_request: str
+    # Reenviar o run_id de uma execução que falhou retoma do último nó concluído
+    run_id: str | None = Field(None)
+    # Datas flexíveis: consulta ±N dias e escolhe as datas mais baratas antes de hotéis e curadoria
+    flex_days: int | None = Field(None, ge=0, le=7)
+    # Ignora as respostas do LLM em cache (extração e curadoria) neste pedido
+    bypass_llm_cache: bool = Field(False)
+
+class DegradedSection(BaseModel):
+    section: str
+    provider: str
+    reason: str
+    message: str
 
 class TripDataResponse(BaseModel):
     final_report: FinalReport | None = Field(None)
+    origin: str | None = Field(None)
     destination: str | None = Field(None)
     start_date: str | None = Field(None)
     end_date: str | None = Field(None)
     error: str | None = Field(None)
+    run_id: str | None = Field(None)
+    resumable: bool = Field(False, description="True se a execução falhou e pode ser retomada com o mesmo run_id")
+    degraded_sections: List[DegradedSection] = Field(default_factory=list, description="Seções sem dados por provedor degradado")
+    price_calendar: Dict[str, Any] | None = Field(None, description="Matriz de preços consultada quando flex_days é usado")
+    itinerary: Dict[str, Any] | None = Field(None, description="Atividades agrupadas por dia e distâncias aos hotéis")
+
+class FlightCalendarRequest(BaseModel):
+    origin: str
+    destination: str
+    departure_date: str
+    return_date: str
+    flex_days: int = Field(3, ge=0, le=7)
+    max_queries: int = Field(20, ge=1, le=100)
+    passengers: int = Field(1, ge=1)
+
+class BatchTripRequest(BaseModel):
+    requests: List[str] = Field(min_length=1, max_length=20, description="Pedidos de viagem em linguagem natural")
+    bypass_llm_cache: bool = Field(False)
+
+# Modelos do refinamento (/plan-trip/{run_id}/refine)
+class RefineCriteria(BaseModel):
+    min_price: float | None = Field(None, description="Preço mínimo (BRL; hotéis: por noite)")
+    max_price: float | None = Field(None, description="Preço máximo (BRL; hotéis: por noite)")
+    max_stops: int | None = Field(None, description="Máximo de paradas (0 = apenas voos diretos)")
+    max_duration_minutes: int | None = Field(None, description="Duração máxima do voo em minutos")
+    min_rating: float | None = Field(None, description="Nota mínima dos hóspedes")
+    min_stars: int | None = Field(None, description="Classificação oficial mínima em estrelas (hotéis sem classificação ficam de fora)")
+    categories: List[str] | None = Field(None, description="Categorias de atividade (ex: Tourism, Leisure)")
+    sort_by: Literal["price", "duration", "rating", "stars", "stops"] | None = Field(None)
+    descending: bool = Field(False)
+    limit: int | None = Field(None, ge=1)
+
+class RefineRequest(BaseModel):
+    flights: RefineCriteria | None = Field(None)
+    hotels: RefineCriteria | None = Field(None)
+    activities: RefineCriteria | None = Field(None)
+    recurate: bool = Field(False, description="Refaz a curadoria apenas das categorias alteradas")
+
+class RefineResponse(BaseModel):
+    run_id: str
+    # Registros (dataclasses) serializados direto pelo Pydantic, sem cópias intermediárias em dict
+    flights: List[Flight]
+    hotels: List[Hotel]
+    activities: List[Activity]
+    final_report: FinalReport | None = Field(None)
+    elapsed_ms: float
+    error: str | None = Field(None)
 
 # Novos modelos para Auth e Relatórios
 class UserCreate(BaseModel):
@@ -37,14 +111,57 @@ class UserCreate(BaseModel):
     password: str
 
 class ReportCreate(BaseModel):
+    origin: str | None = None
     destination: str
     start_date: str
     end_date: str
     content: Dict[str, Any] # Recebe o JSON completo do relatório
 
+class ReportOut(BaseModel):
+    id: int
+    user_id: int | None
+    origin: str | None
+    destination: str | None
+    start_date: str | None
+    end_date: str | None
+    content: Dict[str, Any] | None
+
+REPORT_FIELDS = tuple(ReportOut.model_fields)
+# Valida/filtra as linhas pelo ReportOut e serializa na mesma passada do pydantic-core
+REPORTS_ADAPTER = TypeAdapter(List[ReportOut])
+
 # --- Configuração da App ---
 
-api = FastAPI()
+@asynccontextmanager
+async def lifespan(api: FastAPI):
+    # Cria as tabelas no banco de dados (caso não existam)
+    init_db()
+    # Aquece o grafo e o LLM em segundo plano: o worker já aceita conexões
+    # e o /ready informa quando o grafo estiver pronto.
+    warmup_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    cleanup_task = asyncio.create_task(_cleanup_checkpoints_periodically())
+    # O prefetcher sempre mede a taxa de acerto; os ciclos só rodam se habilitados
+    get_prefetcher()
+    prefetch_task = asyncio.create_task(_prefetch_periodically()) if env_bool("PREFETCH_ENABLED", False) else None
+    yield
+    cleanup_task.cancel()
+    if prefetch_task:
+        prefetch_task.cancel()
+    if not warmup_task.done():
+        warmup_task.cancel()
+
+async def _cleanup_checkpoints_periodically():
+    # Mantém a tabela de checkpoints limitada (retenção por idade e por quantidade)
+    interval = env_int("CHECKPOINT_CLEANUP_INTERVAL_SECONDS", 600)
+    while True:
+        try:
+            await asyncio.to_thread(cleanup_checkpoints)
+        except Exception as e:
+            print(f"Erro na limpeza de checkpoints: {e}")
+        await asyncio.sleep(interval)
+
+# Encoder nativo como padrão; rotas com modelos retornam FastJSONResponse(modelo) diretamente
+api = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 origins = ["*"]
 
@@ -55,6 +172,46 @@ api.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Compressão br/gzip negociada, só para respostas acima de COMPRESSION_MIN_BYTES
+api.add_middleware(CompressionMiddleware)
+
+async def _prefetch_periodically():
+    # Aquece os caches dos destinos/rotas populares dentro da cota configurada
+    interval = env_int("PREFETCH_INTERVAL_SECONDS", 3600)
+    await asyncio.sleep(env_int("PREFETCH_INITIAL_DELAY_SECONDS", 60))
+    while True:
+        try:
+            await asyncio.to_thread(get_prefetcher().run_once)
+        except Exception as e:
+            print(f"Erro no prefetch: {e}")
+        await asyncio.sleep(interval)
+
+# --- ROTA DE READINESS ---
+
+@api.get("/ready")
+def readiness():
+    # 200 quando o grafo e o LLM estão aquecidos; 503 enquanto aquecem ou se falharam
+    warm = warmup_status()
+    ready = warm["graph_ready"] and warm["llm_ready"]
+    return FastJSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"ready": ready, **warm, "providers": resilience_status()},
+    )
+
+@api.get("/prefetch/stats")
+def prefetch_stats():
+    # Eficácia do prefetch: acessos do caminho quente que caíram em chaves aquecidas
+    return get_prefetcher().report()
+
+@api.get("/llm/stats")
+def llm_statistics():
+    # Modelo/tier de cada nó, latência média, tokens e fallbacks por timeout
+    return llm_stats()
+
+@api.get("/llm-cache/stats")
+def llm_cache_statistics():
+    # Acertos do cache persistente do LLM por ponto de chamada (extração, curadoria)
+    return llm_cache_stats()
 
 # --- ROTAS DE AUTENTICAÇÃO (Novas) ---
 
@@ -97,6 +254,7 @@ def save_report(
 ):
     new_report = Report(
         user_id=current_user.id,
+        origin=report_in.origin,
         destination=report_in.destination,
         start_date=report_in.start_date,
         end_date=report_in.end_date,
@@ -107,10 +265,46 @@ def save_report(
     db.refresh(new_report)
     return {"id": new_report.id, "message": "Relatório salvo com sucesso!"}
 
-@api.get("/reports")
+@api.get("/reports", response_model=List[ReportOut])
 def get_my_reports(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    # Retorna apenas os relatórios do usuário logado
-    return db.query(Report).filter(Report.user_id == current_user.id).all()
+    # Retorna apenas os relatórios do usuário logado.
+    # Lê só as colunas (sem instanciar objetos ORM). A resposta sai pronta (o FastAPI não
+    # revalida respostas próprias), então a validação pelo ReportOut é feita aqui.
+    rows = db.query(*(getattr(Report, field) for field in REPORT_FIELDS)).filter(Report.user_id == current_user.id).all()
+    reports = REPORTS_ADAPTER.validate_python([dict(row._mapping) for row in rows])
+    return Response(REPORTS_ADAPTER.dump_json(reports), media_type="application/json")
+
+@api.get("/reports/search")
+def search_my_reports(
+    q: str = Query(min_length=1, max_length=200, description="Ex: 'hotel Batel', 'Curitiba'"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user)
+):
+    # Busca textual (FTS5) em destino, nomes, locais e justificativas dos itens curados
+    if not search_available():
+        raise HTTPException(status_code=503, detail="Busca de relatórios indisponível neste banco de dados")
+    return FastJSONResponse(search_reports(current_user.id, q, page, page_size))
+
+@api.get("/reports/export")
+def export_my_reports(
+    destination: str | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    compress: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    # Exporta os relatórios do usuário como NDJSON em streaming (memória constante),
+    # filtrando por destino e pela data de início (date_from/date_to, AAAA-MM-DD).
+    # compress=true devolve o arquivo .ndjson.gz
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from deve ser anterior a date_to")
+    filename = "relatorios.ndjson.gz" if compress else "relatorios.ndjson"
+    return StreamingResponse(
+        export_reports(current_user.id, destination, date_from, date_to, compress),
+        media_type="application/gzip" if compress else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 @api.delete("/reports/{report_id}")
 def delete_report(
@@ -131,27 +325,42 @@ def delete_report(
 @api.post("/plan-trip", response_model=TripDataResponse)
 async def plan_trip(request: TripRequest):
     print("--- Endpoint /plan-trip ACESSADO ---")
+    run_id = request.run_id or uuid.uuid4().hex
+    # O grafo é síncrono: roda numa thread para não bloquear o event loop
+    result = await asyncio.to_thread(_execute_plan, request.user_request, run_id, None, request.flex_days, request.bypass_llm_cache)
+    return FastJSONResponse(result)
+
+def _execute_plan(user_request: str, run_id: str, extracted: ExtractedInfo | None = None, flex_days: int | None = None,
+                  bypass_llm_cache: bool = False) -> TripDataResponse:
     start_time = time.time()
-    print(f"Recebido user_request: {request.user_request}")
+    print(f"Recebido user_request: {user_request}")
     
     # O estado inicial agora usa os campos 'raw_'
+    # (no lote, origem/destino/datas já vêm extraídos e o nó de extração pula o LLM)
     initial_state = TravelAppState(
-        user_request=request.user_request,
-        origin=None,
-        destination=None,
-        start_date=None,
-        end_date=None,
+        user_request=user_request,
+        origin=extracted.origin if extracted else None,
+        destination=extracted.destination if extracted else None,
+        start_date=extracted.start_date if extracted else None,
+        end_date=extracted.end_date if extracted else None,
         raw_flights=None,
         raw_hotels=None,
         raw_activities=None,
         final_report=None,
-        error=None
+        error=None,
+        degraded=[],
+        flex_days=flex_days,
+        price_calendar=None,
+        itinerary=None
     )
     
     try:
-        print("Invocando app.invoke...")
-        final_response_state = langgraph_app.invoke(initial_state)
+        print(f"Invocando o grafo (run_id={run_id})...")
+        with llm_cache_bypass(bypass_llm_cache):
+            final_response_state = run_plan(initial_state, run_id)
         print("app.invoke concluído.")
+        # Guarda os resultados brutos para refinamentos sem refazer o grafo
+        save_run(run_id, final_response_state)
 
         # Checa se houve um erro E NENHUM relatório foi gerado
         if final_response_state.get("error") and not final_response_state.get("final_report"):
@@ -159,19 +368,29 @@ async def plan_trip(request: TripRequest):
              print(f"Erro retornado pelo grafo: {error_msg}")
              return TripDataResponse(
                  final_report=None,
+                 origin=final_response_state.get('origin'),
                  destination=final_response_state.get('destination'),
                  start_date=final_response_state.get('start_date'),
                  end_date=final_response_state.get('end_date'),
-                 error=error_msg
+                 error=error_msg,
+                 run_id=run_id,
+                 degraded_sections=final_response_state.get('degraded') or [],
+                 price_calendar=final_response_state.get('price_calendar'),
+                 itinerary=final_response_state.get('itinerary')
              )
 
         print("Preparando resposta JSON...")
         response_data = TripDataResponse(
             final_report=final_response_state.get('final_report'), 
+            origin=final_response_state.get('origin'),
             destination=final_response_state.get('destination'),
             start_date=final_response_state.get('start_date'),
             end_date=final_response_state.get('end_date'),
-            error=final_response_state.get('error') 
+            error=final_response_state.get('error'),
+            run_id=run_id,
+            degraded_sections=final_response_state.get('degraded') or [],
+            price_calendar=final_response_state.get('price_calendar'),
+            itinerary=final_response_state.get('itinerary')
         )
         end_time = time.time()
         print(f"Respondendo com sucesso. Tempo total: {end_time - start_time:.2f} segundos.")
@@ -181,9 +400,140 @@ async def plan_trip(request: TripRequest):
         print(f"!!! Erro EXCEPCIONAL na API /plan-trip: {e}")
         import traceback
         traceback.print_exc()
+        # Se os nós anteriores ficaram salvos no checkpoint, o cliente pode
+        # reenviar o mesmo run_id para retomar sem repetir as chamadas pagas.
+        try:
+            resumable = is_resumable(run_id)
+        except Exception:
+            resumable = False
+        if resumable:
+            saved_state = load_checkpoint_state(run_id) or {}
+            return TripDataResponse(
+                final_report=None,
+                origin=saved_state.get('origin'),
+                destination=saved_state.get('destination'),
+                start_date=saved_state.get('start_date'),
+                end_date=saved_state.get('end_date'),
+                error=str(e),
+                run_id=run_id,
+                resumable=True,
+                degraded_sections=saved_state.get('degraded') or [],
+                price_calendar=saved_state.get('price_calendar'),
+                itinerary=saved_state.get('itinerary')
+            )
         raise HTTPException(status_code=500, detail=f"Erro interno do servidor: {e}")
 
 
+@api.post("/flights/calendar")
+async def flight_calendar(request: FlightCalendarRequest):
+    # Matriz de preços para datas flexíveis (±flex_days), sem rodar o grafo completo
+    from app.tools.flight_tools import search_flight_price_calendar
+
+    def run():
+        with plan_budget():
+            return search_flight_price_calendar.invoke(request.model_dump())
+
+    try:
+        calendar = await asyncio.to_thread(run)
+    except ProviderUnavailable as e:
+        # Lookup de IATA (Tavily) lento, com circuito aberto ou sem orçamento
+        raise HTTPException(status_code=503, detail=f"Calendário de preços indisponível no momento ({e.provider}: {e.reason})")
+    if calendar.get("error"):
+        raise HTTPException(status_code=400, detail=calendar["error"])
+    return FastJSONResponse(calendar)
+
+
+@api.post("/plan-trips/batch")
+async def plan_trips_batch(batch: BatchTripRequest):
+    # Planeja várias viagens de uma vez. A extração é feita numa única chamada ao LLM;
+    # as buscas rodam em paralelo e lookups repetidos (mesmo destino, mesmas datas,
+    # mesmos aeroportos) são deduplicados pelos caches single-flight dos nós.
+    # A resposta é NDJSON: uma linha {"index": i, ...TripDataResponse} por viagem, na ordem em que terminam.
+    print(f"--- Endpoint /plan-trips/batch ACESSADO ({len(batch.requests)} pedidos) ---")
+
+    async def stream():
+        try:
+            # to_thread copia o contexto, então o bypass vale dentro da thread
+            with llm_cache_bypass(batch.bypass_llm_cache):
+                extracted = await asyncio.to_thread(extract_batch, batch.requests)
+        except Exception as e:
+            print(f"Erro na extração em lote, usando extração individual: {e}")
+            extracted = [None] * len(batch.requests)
+
+        semaphore = asyncio.Semaphore(env_int("BATCH_MAX_CONCURRENCY", 4))
+
+        async def plan_one(index: int, user_request: str, info: ExtractedInfo | None):
+            run_id = uuid.uuid4().hex
+            async with semaphore:
+                try:
+                    result = await asyncio.to_thread(_execute_plan, user_request, run_id, info, None, batch.bypass_llm_cache)
+                except HTTPException as e:
+                    # Mantém o run_id para o cliente retomar (se houver checkpoint) ou consultar a execução
+                    try:
+                        resumable = await asyncio.to_thread(is_resumable, run_id)
+                    except Exception:
+                        resumable = False
+                    result = TripDataResponse(error=e.detail, run_id=run_id, resumable=resumable)
+                return index, result
+
+        tasks = [asyncio.create_task(plan_one(i, r, info)) for i, (r, info) in enumerate(zip(batch.requests, extracted))]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                index, result = await finished
+                # Cada linha é serializada direto do modelo; o índice é prefixado ao objeto
+                yield b'{"index":%d,' % index + dumps(result)[1:] + b"\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@api.post("/plan-trip/{run_id}/refine", response_model=RefineResponse)
+def refine_trip(run_id: str, refine: RefineRequest):
+    # Filtra/ordena em memória os resultados brutos de uma execução anterior
+    start_time = time.perf_counter()
+    run = load_run(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Execução não encontrada ou expirada")
+
+    refined = {}
+    for category, raw_field in (("flights", "raw_flights"), ("hotels", "raw_hotels"), ("activities", "raw_activities")):
+        criteria = getattr(refine, category)
+        criteria_dict = criteria.model_dump(exclude_none=True) if criteria else {}
+        # Execuções antigas (checkpoints anteriores aos registros) ainda guardam dicts
+        refined[category] = refine_items(ensure_records(category, run.get(raw_field)), criteria_dict)
+
+    final_report = run.get("final_report")
+    error = None
+    if refine.recurate and final_report is not None:
+        # Refaz a curadoria apenas das categorias que receberam critérios
+        updates = {}
+        for category, (report_field, _, _) in CURATED_CATEGORIES.items():
+            if getattr(refine, category) is None:
+                continue
+            try:
+                updates[report_field] = recurate_category(run, category, refined[category])
+            except Exception as e:
+                print(f"!!! Erro ao re-curar '{category}': {e}")
+                error = f"Erro ao refazer a curadoria de {category}: {e}"
+        if updates:
+            final_report = final_report.model_copy(update=updates)
+            save_run(run_id, {**run, "final_report": final_report})
+
+    elapsed_ms = (time.perf_counter() - start_time) * 1000
+    print(f"Refinamento da execução {run_id} concluído em {elapsed_ms:.1f} ms.")
+    return FastJSONResponse(RefineResponse(
+        run_id=run_id,
+        flights=refined["flights"],
+        hotels=refined["hotels"],
+        activities=refined["activities"],
+        final_report=final_report,
+        elapsed_ms=round(elapsed_ms, 2),
+        error=error
+    ))
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(api, host="0.0.0.0", port=8000)
\ No newline at end of file
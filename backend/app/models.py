@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, JSON, Text
+from datetime import datetime, timezone
+from sqlalchemy import Column, Integer, String, ForeignKey, JSON, Text, DateTime
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -13,10 +14,33 @@ class Report(Base):
     __tablename__ = "reports"
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
+    origin = Column(String, nullable=True) # Usado pelo prefetch de rotas populares
     destination = Column(String)
     start_date = Column(String)
     end_date = Column(String)
     # Salvamos o JSON completo do relatório gerado pelo LangGraph
     content = Column(JSON) 
     
-    owner = relationship("User", back_populates="reports")
\ No newline at end of file
+    owner = relationship("User", back_populates="reports")
+
+class PlanRun(Base):
+    # Execuções do grafo com checkpoint (uma thread do LangGraph por run_id).
+    # Usada apenas para a política de retenção dos checkpoints.
+    __tablename__ = "plan_runs"
+    run_id = Column(String, primary_key=True)
+    status = Column(String, default="running") # running | failed | completed
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+
+class LLMCacheEntry(Base):
+    # Respostas do LLM reaproveitadas entre execuções (extração e curadoria).
+    # A chave é o hash do modelo, temperatura, prompt renderizado e instruções de formato.
+    __tablename__ = "llm_cache"
+    key = Column(String, primary_key=True)
+    call_site = Column(String, index=True)
+    model = Column(String)
+    response = Column(Text)
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    last_used_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+    expires_at = Column(DateTime, index=True)
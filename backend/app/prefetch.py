@@ -0,0 +1,197 @@
+import contextvars
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List
+from sqlalchemy import func
+from app.cache import add_node_access_hook, get_node_cache, min_node_ttl
+from app.config import env_bool, env_float, env_int, env_str
+from app.database import SessionLocal
+from app.models import Report
+from app.resilience import plan_budget
+
+# Prefetch periódico dos destinos e rotas mais populares (a partir dos relatórios salvos).
+# Aquece os caches de lookups (IATA, geocoding, imagens), as atividades por destino e,
+# dentro de uma cota de buscas por ciclo, voos e hotéis das datas próximas.
+# O relatório de eficácia mede quantos acessos do caminho quente caíram numa chave aquecida.
+
+# Marca as chamadas feitas pelo próprio prefetcher (não contam como acessos do caminho quente)
+_prefetching: contextvars.ContextVar[bool] = contextvars.ContextVar("prefetching", default=False)
+
+PREFETCHED_NODES = ("flights", "hotels", "activities")
+
+class Prefetcher:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Só chaves calculadas pelo próprio prefetcher (as já presentes no cache vindas de
+        # pedidos de usuários contam em `already_warm` do ciclo, não na taxa de acerto)
+        self.warmed_keys: Dict[str, float] = {} # chave do nó -> momento em que foi aquecida
+        self.hot_lookups: Counter = Counter()
+        self.warm_hits: Counter = Counter()
+        self.cycles = 0
+        self.last_cycle: Dict[str, Any] | None = None
+        add_node_access_hook(self._on_node_access)
+
+    # --- Medição de eficácia ---
+    def _on_node_access(self, node: str, key: str, from_cache: bool) -> None:
+        if _prefetching.get() or node not in PREFETCHED_NODES:
+            return
+        with self._lock:
+            self.hot_lookups[node] += 1
+            if from_cache and key in self.warmed_keys:
+                self.warm_hits[node] += 1
+            elif not from_cache:
+                # O valor aquecido expirou e o usuário recalculou: a entrada nova não é do prefetch
+                self.warmed_keys.pop(key, None)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            total_lookups = sum(self.hot_lookups.values())
+            total_hits = sum(self.warm_hits.values())
+            return {
+                "enabled": env_bool("PREFETCH_ENABLED", False),
+                "cycles": self.cycles,
+                "warmed_keys": len(self.warmed_keys),
+                "hot_lookups": dict(self.hot_lookups),
+                "warm_hits": dict(self.warm_hits),
+                "warm_hit_rate": round(total_hits / total_lookups, 3) if total_lookups else None,
+                "warm_hit_rate_by_node": {
+                    node: round(self.warm_hits[node] / count, 3) for node, count in self.hot_lookups.items() if count
+                },
+                "last_cycle": self.last_cycle,
+            }
+
+    # --- Alvos populares ---
+    def popular_targets(self) -> Dict[str, List[Dict[str, Any]]]:
+        top = env_int("PREFETCH_TOP_DESTINATIONS", 10)
+        horizon = env_int("PREFETCH_HORIZON_DAYS", 30)
+        today = date.today()
+        db = SessionLocal()
+        try:
+            destinations = (
+                db.query(Report.destination, func.count(Report.id).label("count"))
+                .filter(Report.destination.isnot(None))
+                .group_by(Report.destination)
+                .order_by(func.count(Report.id).desc())
+                .limit(top).all()
+            )
+            routes = (
+                db.query(Report.origin, Report.destination, func.count(Report.id).label("count"))
+                .filter(Report.origin.isnot(None), Report.destination.isnot(None))
+                .group_by(Report.origin, Report.destination)
+                .order_by(func.count(Report.id).desc())
+                .limit(top).all()
+            )
+            # Datas ISO (AAAA-MM-DD) comparam corretamente como texto
+            trips = (
+                db.query(Report.origin, Report.destination, Report.start_date, Report.end_date,
+                         func.count(Report.id).label("count"))
+                .filter(Report.start_date >= today.isoformat(),
+                        Report.start_date <= (today + timedelta(days=horizon)).isoformat(),
+                        Report.end_date > Report.start_date)
+                .group_by(Report.origin, Report.destination, Report.start_date, Report.end_date)
+                .order_by(func.count(Report.id).desc())
+                .limit(top).all()
+            )
+        finally:
+            db.close()
+        return {
+            "destinations": [{"destination": d, "count": c} for d, c in destinations],
+            "routes": [{"origin": o, "destination": d, "count": c} for o, d, c in routes],
+            "trips": [{"origin": o, "destination": d, "start_date": s, "end_date": e, "count": c}
+                      for o, d, s, e, c in trips],
+        }
+
+    # --- Ciclo de prefetch ---
+    def run_once(self) -> Dict[str, Any]:
+        """Executa um ciclo de prefetch respeitando a cota de buscas (PREFETCH_MAX_SEARCHES)."""
+        from app.langgraph_app import activity_agent_node, flight_agent_node, hotel_agent_node
+        from app.tools.flight_tools import _get_iata_code
+        from app.tools.activity_tools import _get_city_coordinates
+
+        token = _prefetching.set(True)
+        started = time.perf_counter()
+        quota = env_int("PREFETCH_MAX_SEARCHES", 20)
+        cycle = {"searches": 0, "already_warm": 0, "lookups": 0, "errors": 0, "skipped_by_quota": 0}
+        node_cache = get_node_cache()
+
+        def warm_node(node, state: Dict[str, Any]) -> None:
+            key = node.cache_key(state)
+            if key in node_cache:
+                # Já em cache (de um ciclo anterior ou de um pedido de usuário): não vira chave aquecida
+                cycle["already_warm"] += 1
+                return
+            if cycle["searches"] >= quota:
+                cycle["skipped_by_quota"] += 1
+                return
+            cycle["searches"] += 1
+            result = node(state)
+            if result.get("error") or result.get("degraded"):
+                cycle["errors"] += 1
+                return
+            with self._lock:
+                self.warmed_keys[key] = time.time()
+
+        def lookup(fn, *args) -> None:
+            cycle["lookups"] += 1
+            try:
+                fn(*args)
+            except Exception as e:
+                cycle["errors"] += 1
+                print(f"Prefetch: lookup falhou ({e})")
+
+        try:
+            with plan_budget(env_float("PREFETCH_BUDGET_SECONDS", 300.0)):
+                targets = self.popular_targets()
+                geoapify_key = env_str("GEOAPIFY_API_KEY")
+
+                # 1. Lookups e atividades dos destinos populares (não dependem de datas)
+                for target in targets["destinations"]:
+                    destination = target["destination"]
+                    lookup(_get_iata_code, destination)
+                    if geoapify_key:
+                        lookup(_get_city_coordinates, destination, geoapify_key)
+                    # As atividades ignoram as datas (a chave do nó só usa o destino)
+                    today = date.today().isoformat()
+                    warm_node(activity_agent_node, {"destination": destination, "start_date": today, "end_date": today, "error": None})
+
+                # 2. Aeroportos de origem das rotas populares
+                for route in targets["routes"]:
+                    lookup(_get_iata_code, route["origin"])
+
+                # 3. Voos e hotéis das viagens próximas (cota limitada). O TTL normal dos preços
+                #    (NODE_CACHE_PRICES_TTL_SECONDS, 15 min) é menor que o intervalo entre ciclos:
+                #    sem estender, quase toda busca aquecida expiraria antes de algum usuário usá-la
+                prices_ttl = env_int("PREFETCH_PRICES_TTL_SECONDS", env_int("PREFETCH_INTERVAL_SECONDS", 3600))
+                with min_node_ttl(prices_ttl):
+                    for trip in targets["trips"]:
+                        state = {**trip, "error": None}
+                        warm_node(hotel_agent_node, state)
+                        if trip["origin"]:
+                            warm_node(flight_agent_node, state)
+        except Exception as e:
+            cycle["errors"] += 1
+            print(f"!!! Erro no ciclo de prefetch: {e}")
+        finally:
+            _prefetching.reset(token)
+
+        cycle["seconds"] = round(time.perf_counter() - started, 2)
+        cycle["finished_at"] = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            self.cycles += 1
+            self.last_cycle = cycle
+            # Esquece chaves aquecidas que já saíram do cache
+            self.warmed_keys = {k: t for k, t in self.warmed_keys.items() if k in node_cache}
+        print(f"Prefetch concluído: {cycle}")
+        return cycle
+
+_prefetcher: Prefetcher | None = None
+_prefetcher_lock = threading.Lock()
+
+def get_prefetcher() -> Prefetcher:
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher()
+        return _prefetcher
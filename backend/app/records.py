@@ -0,0 +1,89 @@
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, Iterable, List
+
+# Registros compactos dos resultados das ferramentas (voos, hotéis e atividades).
+# Dataclasses com __slots__: sem um __dict__ por item nem as mesmas chaves repetidas em cada
+# dict. Medido com `python benchmark.py memory` (bytes por item):
+#   em memória (só o contêiner): Flight 121 vs 281 do dict, Hotel 273 vs 473; Activity reserva
+#   desde a busca os 6 slots da etapa geoespacial, então fica maior antes dela (321 vs 281)
+#   e menor depois (320 vs 473). O estado do nó de atividades (antes do roteiro) também é
+#   mantido e salvo em checkpoint, então os dois tamanhos coexistem durante a execução.
+#   no checkpoint (msgpack): os registros ficam um pouco maiores que os dicts (~24 B de
+#   cabeçalho de tipo por item; Activity antes do roteiro 625 vs 516, pelos campos geo vazios).
+# O ganho é na memória dos planos em andamento, não no tamanho dos checkpoints.
+# Erros não viram mais linhas {"id": "error"} na lista: as ferramentas lançam SearchError
+# e o nó marca a seção em `degraded`. A conversão para JSON é feita uma vez, na borda
+# (Pydantic na resposta da API, orjson no prompt do curador).
+
+class SearchError(Exception):
+    """A busca falhou por configuração ou erro da API (reportada fora da lista de resultados)."""
+
+    def __init__(self, provider: str, reason: str, detail: str):
+        self.provider = provider
+        self.reason = reason # not_configured | not_found | api_error | partial
+        self.detail = detail
+        super().__init__(f"{provider}: {detail}")
+
+@dataclass(slots=True)
+class Flight:
+    id: str
+    airline: str
+    departure: str
+    arrival: str
+    duration: str
+    price: str
+    stops: int = 0
+    image_url: str | None = None
+    # Campos numéricos para filtrar/ordenar no servidor (/refine)
+    price_value: float | None = None
+    duration_minutes: int | None = None
+
+@dataclass(slots=True)
+class Hotel:
+    id: str
+    name: str
+    location: str
+    rating: int
+    price: str
+    amenities: List[str] = field(default_factory=list)
+    image_url: str | None = None
+    price_value: float | None = None # Sempre por noite (total_rate é dividido pelas noites)
+    rating_value: float | None = None
+    stars: int | None = None
+    # Coordenadas para as distâncias até as atividades (etapa geoespacial)
+    lat: float | None = None
+    lon: float | None = None
+
+@dataclass(slots=True)
+class Activity:
+    id: str
+    title: str
+    description: str
+    duration: str
+    price: str
+    capacity: str
+    image_url: str | None = None
+    lat: float | None = None
+    lon: float | None = None
+    # Preenchidos pela etapa geoespacial (app.geo)
+    distance_to_center_km: float | None = None
+    nearest_hotel_id: str | None = None
+    nearest_hotel_km: float | None = None
+    day: int | None = None
+    day_order: int | None = None
+    leg_km: float | None = None
+
+# Seção do relatório -> tipo do registro
+RECORD_TYPES = {"flights": Flight, "hotels": Hotel, "activities": Activity}
+
+def from_dict(section: str, data: Dict[str, Any]):
+    """Registro a partir de um dict (campos desconhecidos são ignorados)."""
+    record_type = RECORD_TYPES[section]
+    names = {f.name for f in fields(record_type)}
+    return record_type(**{key: value for key, value in data.items() if key in names})
+
+def ensure_records(section: str, items: Iterable[Any] | None) -> List[Any]:
+    """Aceita listas antigas em dict (checkpoints anteriores), descartando as linhas de erro."""
+    record_type = RECORD_TYPES[section]
+    return [item if isinstance(item, record_type) else from_dict(section, item)
+            for item in items or [] if isinstance(item, record_type) or (isinstance(item, dict) and item.get("id") != "error")]
@@ -0,0 +1,60 @@
+from typing import List, Dict, Any
+
+# Filtros e ordenação em memória sobre os resultados brutos de uma execução (registros de app.records).
+# Usam os campos numéricos preenchidos pelas ferramentas (price_value, duration_minutes,
+# rating_value, stars), então não precisam chamar nenhuma API nem o LLM.
+
+# Critério de ordenação -> campo numérico do item
+SORT_FIELDS = {
+    "price": "price_value",
+    "duration": "duration_minutes",
+    "rating": "rating_value",
+    "stars": "stars", # Classificação oficial (hotel_class); a nota dos hóspedes é "rating"
+    "stops": "stops",
+}
+
+def _at_most(value, limit) -> bool:
+    return value is not None and value <= limit
+
+def _at_least(value, limit) -> bool:
+    return value is not None and value >= limit
+
+def _field(item: Any, name: str) -> Any:
+    # Cada tipo de registro tem só os seus campos (ex: voos não têm stars)
+    return getattr(item, name, None)
+
+def _value(item: Any, criterion: str) -> Any:
+    # Mesmo valor para filtrar e para ordenar: min_stars e sort_by="stars" concordam entre si
+    return _field(item, SORT_FIELDS[criterion])
+
+def refine_items(items: List[Any] | None, criteria: Dict[str, Any]) -> List[Any]:
+    """Aplica os critérios (max_price, max_stops, min_stars, sort_by...) e retorna uma nova lista."""
+    results = list(items or [])
+
+    if criteria.get("min_price") is not None:
+        results = [i for i in results if _at_least(_field(i, "price_value"), criteria["min_price"])]
+    if criteria.get("max_price") is not None:
+        results = [i for i in results if _at_most(_field(i, "price_value"), criteria["max_price"])]
+    if criteria.get("max_stops") is not None:
+        results = [i for i in results if _at_most(_field(i, "stops"), criteria["max_stops"])]
+    if criteria.get("max_duration_minutes") is not None:
+        results = [i for i in results if _at_most(_field(i, "duration_minutes"), criteria["max_duration_minutes"])]
+    if criteria.get("min_rating") is not None:
+        results = [i for i in results if _at_least(_field(i, "rating_value"), criteria["min_rating"])]
+    if criteria.get("min_stars") is not None:
+        results = [i for i in results if _at_least(_value(i, "stars"), criteria["min_stars"])]
+    if criteria.get("categories"):
+        wanted = {c.lower() for c in criteria["categories"]}
+        results = [i for i in results if str(_field(i, "capacity") or "").lower() in wanted]
+
+    sort_by = criteria.get("sort_by")
+    if sort_by:
+        descending = bool(criteria.get("descending"))
+        # Itens sem valor numérico vão sempre para o fim
+        present = [i for i in results if _value(i, sort_by) is not None]
+        missing = [i for i in results if _value(i, sort_by) is None]
+        results = sorted(present, key=lambda i: _value(i, sort_by), reverse=descending) + missing
+
+    if criteria.get("limit") is not None:
+        results = results[:criteria["limit"]]
+    return results
@@ -0,0 +1,52 @@
+import zlib
+from datetime import date
+from typing import Iterator
+from sqlalchemy import func
+from app.config import env_int
+from app.database import SessionLocal
+from app.models import Report
+from app.responses import dumps
+
+# Exportação em massa dos relatórios de um usuário (NDJSON, um relatório por linha).
+# As linhas saem de um cursor com yield_per, em lotes, então a memória fica constante
+# independentemente do tamanho do histórico (nada de carregar todos os relatórios como no GET /reports).
+
+EXPORT_FIELDS = ("id", "origin", "destination", "start_date", "end_date", "content")
+
+def _export_query(db, user_id: int, destination: str | None, date_from: date | None, date_to: date | None):
+    query = db.query(*(getattr(Report, field) for field in EXPORT_FIELDS)).filter(Report.user_id == user_id)
+    if destination:
+        query = query.filter(func.lower(func.trim(Report.destination)) == " ".join(destination.split()).lower())
+    # Datas ISO (AAAA-MM-DD) comparam corretamente como texto; o filtro é pela data de início
+    if date_from:
+        query = query.filter(Report.start_date >= date_from.isoformat())
+    if date_to:
+        query = query.filter(Report.start_date <= date_to.isoformat())
+    return query.order_by(Report.id)
+
+def export_reports(user_id: int, destination: str | None = None, date_from: date | None = None,
+                   date_to: date | None = None, compress: bool = False) -> Iterator[bytes]:
+    """
+    Gera o NDJSON em pedaços (um por lote de EXPORT_BATCH_SIZE relatórios), opcionalmente
+    como um stream gzip. Abre a própria sessão: o gerador roda depois que a rota retorna.
+    """
+    batch_size = env_int("EXPORT_BATCH_SIZE", 200)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+    db = SessionLocal()
+    try:
+        query = _export_query(db, user_id, destination, date_from, date_to)
+        buffer = []
+        for row in query.yield_per(batch_size):
+            buffer.append(dumps(dict(row._mapping)))
+            buffer.append(b"\n")
+            if len(buffer) >= 2 * batch_size:
+                chunk = b"".join(buffer)
+                buffer.clear()
+                yield compressor.compress(chunk) if compressor else chunk
+        chunk = b"".join(buffer)
+        if compressor:
+            yield compressor.compress(chunk) + compressor.flush()
+        elif chunk:
+            yield chunk
+    finally:
+        db.close()
@@ -0,0 +1,179 @@
+import re
+from typing import Any, Dict, List
+from sqlalchemy import event, text
+from app.database import SessionLocal, engine
+from app.models import Report
+
+# Busca textual nos relatórios salvos com um índice SQLite FTS5 (reports_fts, rowid = reports.id).
+# Indexa o destino e, de dentro do JSON `content`, os nomes, locais e justificativas dos itens
+# curados. O índice é mantido pelos eventos do ORM no save/delete (mesma transação) e
+# reconstruído no startup se estiver fora de sincronia (ex: bancos anteriores ao índice).
+
+# Pesos do bm25 por coluna (destination, names, locations, justifications).
+# O filtro por usuário é feito pelo JOIN com reports (chave primária), bem mais barato
+# que ler uma coluna não indexada do FTS para cada resultado.
+BM25_WEIGHTS = (10.0, 8.0, 5.0, 1.0)
+
+_fts_ready = False
+
+def _item_fields(item: Dict[str, Any]) -> tuple[str, str]:
+    data = item.get("data") or {}
+    name = data.get("name") or data.get("title") or data.get("airline") or ""
+    location = data.get("location") or data.get("address") or ""
+    return str(name), str(location)
+
+def document_for(report: Report) -> Dict[str, Any]:
+    """Texto indexável de um relatório (uma linha do reports_fts)."""
+    content = report.content or {}
+    names, locations, justifications = [], [], []
+    for section in ("curated_flights", "curated_hotels", "curated_activities"):
+        for item in content.get(section) or []:
+            if not isinstance(item, dict):
+                continue
+            name, location = _item_fields(item)
+            names.append(name)
+            locations.append(location)
+            justifications.append(str(item.get("justification") or ""))
+    return {
+        "rowid": report.id,
+        "destination": report.destination or "",
+        "names": "\n".join(filter(None, names)),
+        "locations": "\n".join(filter(None, locations)),
+        "justifications": "\n".join(filter(None, justifications)),
+    }
+
+_INSERT_SQL = text(
+    "INSERT INTO reports_fts(rowid, destination, names, locations, justifications) "
+    "VALUES (:rowid, :destination, :names, :locations, :justifications)"
+)
+_DELETE_SQL = text("DELETE FROM reports_fts WHERE rowid = :rowid")
+
+# --- Sincronia com a tabela reports (eventos do ORM) ---
+
+@event.listens_for(Report, "after_insert")
+def _index_inserted(mapper, connection, report: Report) -> None:
+    if _fts_ready:
+        connection.execute(_INSERT_SQL, document_for(report))
+
+@event.listens_for(Report, "after_update")
+def _index_updated(mapper, connection, report: Report) -> None:
+    if _fts_ready:
+        connection.execute(_DELETE_SQL, {"rowid": report.id})
+        connection.execute(_INSERT_SQL, document_for(report))
+
+@event.listens_for(Report, "after_delete")
+def _index_deleted(mapper, connection, report: Report) -> None:
+    if _fts_ready:
+        connection.execute(_DELETE_SQL, {"rowid": report.id})
+
+# --- Criação e reconstrução do índice ---
+
+def setup_search_index() -> bool:
+    """Cria o reports_fts (se preciso) e o reconstrói se divergir da tabela reports."""
+    global _fts_ready
+    if engine.dialect.name != "sqlite":
+        print("Busca de relatórios: FTS5 disponível apenas com SQLite; busca desativada.")
+        return False
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5("
+                "destination, names, locations, justifications, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            ))
+            # Ranking padrão (ORDER BY rank usa o caminho otimizado do FTS5)
+            conn.execute(text("INSERT INTO reports_fts(reports_fts, rank) VALUES ('rank', :rank)"),
+                         {"rank": f"bm25({', '.join(map(str, BM25_WEIGHTS))})"})
+            indexed = conn.execute(text("SELECT count(*) FROM reports_fts")).scalar()
+            total = conn.execute(text("SELECT count(*) FROM reports")).scalar()
+    except Exception as e:
+        print(f"Busca de relatórios: FTS5 indisponível ({e}); busca desativada.")
+        return False
+    _fts_ready = True
+    if indexed != total:
+        rebuild_search_index()
+    return True
+
+def rebuild_search_index(batch_size: int = 500) -> int:
+    """Reindexa todos os relatórios (em lotes, sem carregar o histórico inteiro)."""
+    db = SessionLocal()
+    count = 0
+    try:
+        connection = db.connection()
+        connection.execute(text("DELETE FROM reports_fts"))
+        batch = []
+        for report in db.query(Report).yield_per(batch_size):
+            batch.append(document_for(report))
+            if len(batch) >= batch_size:
+                connection.execute(_INSERT_SQL, batch)
+                count += len(batch)
+                batch.clear()
+        if batch:
+            connection.execute(_INSERT_SQL, batch)
+            count += len(batch)
+        db.commit()
+    finally:
+        db.close()
+    print(f"Busca de relatórios: índice reconstruído ({count} relatórios).")
+    return count
+
+def search_available() -> bool:
+    return _fts_ready
+
+# --- Consulta ---
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+def _match_expression(query: str, operator: str) -> str | None:
+    # Cada palavra vira um termo entre aspas com prefixo ("bat"*), então a sintaxe do
+    # FTS5 (aspas, NEAR, parênteses...) digitada pelo usuário nunca quebra a consulta
+    terms = _TERM_RE.findall(query)
+    if not terms:
+        return None
+    return f" {operator} ".join(f'"{term}"*' for term in terms)
+
+# A página é ordenada primeiro; o snippet só é gerado para as linhas retornadas
+_SEARCH_SQL = text("""
+    WITH page AS (
+        SELECT reports_fts.rowid AS id, reports_fts.rank AS score
+        FROM reports_fts JOIN reports r ON r.id = reports_fts.rowid
+        WHERE reports_fts MATCH :match AND r.user_id = :user_id
+        ORDER BY reports_fts.rank
+        LIMIT :limit OFFSET :offset
+    )
+    SELECT r.id, r.origin, r.destination, r.start_date, r.end_date, page.score,
+           snippet(reports_fts, -1, '[', ']', '…', 12) AS snippet
+    FROM page
+    JOIN reports_fts ON reports_fts.rowid = page.id
+    JOIN reports r ON r.id = page.id
+    WHERE reports_fts MATCH :match
+    ORDER BY page.score
+""")
+_COUNT_SQL = text(
+    "SELECT count(*) FROM reports_fts JOIN reports r ON r.id = reports_fts.rowid "
+    "WHERE reports_fts MATCH :match AND r.user_id = :user_id"
+)
+
+def search_reports(user_id: int, query: str, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+    """
+    Busca nos relatórios do usuário, ordenada pelo bm25 (BM25_WEIGHTS).
+    Exige todas as palavras; se nenhuma viagem tiver todas, aceita qualquer uma delas.
+    """
+    results: List[Dict[str, Any]] = []
+    total = 0
+    db = SessionLocal()
+    try:
+        connection = db.connection()
+        for operator in ("AND", "OR"):
+            match = _match_expression(query, operator)
+            if match is None:
+                break
+            params = {"match": match, "user_id": user_id}
+            total = connection.execute(_COUNT_SQL, params).scalar()
+            if total:
+                rows = connection.execute(_SEARCH_SQL, {**params, "limit": page_size, "offset": (page - 1) * page_size})
+                results = [{**row._mapping, "score": round(-row.score, 4)} for row in rows]
+                break
+    finally:
+        db.close()
+    return {"query": query, "total": total, "page": page, "page_size": page_size, "results": results}
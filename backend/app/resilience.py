@@ -0,0 +1,210 @@
+import contextvars
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Callable, Dict
+from app.config import env_bool, env_float, env_int
+
+# Camada de resiliência para os provedores externos (SerpAPI, Tavily, Geoapify):
+# - prazo por provedor, limitado pelo orçamento total do planejamento;
+# - requisição duplicada ("hedge") após o p95 de latência, só para lookups idempotentes;
+# - circuit breaker por provedor, que falha rápido enquanto o provedor está degradado.
+
+class ProviderUnavailable(Exception):
+    """O provedor não respondeu a tempo, está com o circuito aberto ou o orçamento acabou."""
+
+    def __init__(self, provider: str, reason: str):
+        self.provider = provider
+        self.reason = reason # timeout | circuit_open | budget_exhausted
+        super().__init__(f"Provedor '{provider}' indisponível ({reason})")
+
+# Provedor -> (prazo padrão em segundos, se pode receber requisição duplicada)
+PROVIDERS = {
+    "tavily": (10.0, True),
+    "geoapify_geocode": (5.0, True),
+    "geoapify_places": (10.0, False),
+    "serpapi_images": (6.0, True),
+    "serpapi_flights": (25.0, False),
+    "serpapi_hotels": (25.0, False),
+}
+
+def provider_timeout(provider: str) -> float:
+    default, _ = PROVIDERS[provider]
+    return env_float(f"PROVIDER_TIMEOUT_{provider.upper()}", default)
+
+# --- Orçamento total do planejamento (propagado por contextvar) ---
+_plan_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("plan_deadline", default=None)
+
+@contextmanager
+def plan_budget(seconds: float | None = None):
+    """Define o prazo total para as chamadas de provedores feitas dentro do bloco."""
+    seconds = seconds if seconds is not None else env_float("PLAN_BUDGET_SECONDS", 90.0)
+    token = _plan_deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _plan_deadline.reset(token)
+
+def remaining_budget() -> float | None:
+    deadline = _plan_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+# --- Circuit breaker e latências por provedor ---
+class CircuitBreaker:
+    """Abre após N falhas seguidas; após o cooldown deixa passar uma tentativa (meio-aberto)."""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+class LatencyTracker:
+    """Janela das últimas latências bem-sucedidas, usada para o atraso do hedge (p95)."""
+
+    def __init__(self, window: int = 100):
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def p95(self) -> float | None:
+        with self._lock:
+            if len(self._samples) < env_int("HEDGE_MIN_SAMPLES", 10):
+                return None
+            return statistics.quantiles(self._samples, n=20)[-1]
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_latencies: Dict[str, LatencyTracker] = {}
+_registry_lock = threading.Lock()
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    with _registry_lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker(
+                failure_threshold=env_int("CIRCUIT_FAILURE_THRESHOLD", 3),
+                reset_seconds=env_float("CIRCUIT_RESET_SECONDS", 60.0),
+            )
+        return _breakers[provider]
+
+def _get_latency(provider: str) -> LatencyTracker:
+    with _registry_lock:
+        return _latencies.setdefault(provider, LatencyTracker())
+
+@lru_cache(maxsize=1)
+def _get_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=env_int("PROVIDER_MAX_WORKERS", 32), thread_name_prefix="provider")
+
+def _submit(fn: Callable, *args, **kwargs):
+    ctx = contextvars.copy_context()
+    return _get_executor().submit(ctx.run, fn, *args, **kwargs)
+
+def call_provider(provider: str, fn: Callable, *args, **kwargs) -> Any:
+    """
+    Executa `fn` com o prazo do provedor (limitado pelo orçamento restante do plano),
+    protegido pelo circuit breaker. Lookups idempotentes recebem uma segunda requisição
+    se a primeira passar do p95 de latência. Exceções de `fn` são repassadas.
+    """
+    timeout = provider_timeout(provider)
+    budget = remaining_budget()
+    if budget is not None:
+        if budget <= 0:
+            raise ProviderUnavailable(provider, "budget_exhausted")
+        timeout = min(timeout, budget)
+
+    breaker = get_breaker(provider)
+    if not breaker.allow():
+        print(f"Resiliência: circuito aberto para '{provider}', falhando rápido.")
+        raise ProviderUnavailable(provider, "circuit_open")
+
+    latency = _get_latency(provider)
+    _, hedgeable = PROVIDERS[provider]
+    start = time.monotonic()
+    deadline = start + timeout
+    futures = [_submit(fn, *args, **kwargs)]
+
+    hedge_delay = latency.p95() if hedgeable and env_bool("HEDGING_ENABLED", True) else None
+    if hedge_delay is not None and hedge_delay < timeout:
+        done, _ = wait(futures, timeout=hedge_delay)
+        if not done:
+            print(f"Resiliência: '{provider}' passou do p95 ({hedge_delay:.2f}s), enviando requisição duplicada.")
+            futures.append(_submit(fn, *args, **kwargs))
+
+    pending = set(futures)
+    error: BaseException | None = None
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            if future.exception() is None:
+                latency.record(time.monotonic() - start)
+                breaker.record_success()
+                return future.result()
+            error = future.exception()
+
+    breaker.record_failure()
+    if error is not None and not pending:
+        raise error
+    print(f"Resiliência: '{provider}' excedeu o prazo de {timeout:.1f}s.")
+    raise ProviderUnavailable(provider, "timeout")
+
+def serpapi_get_dict(provider: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """GoogleSearch(params).get_dict() com timeout de rede e a camada de resiliência."""
+    from serpapi import GoogleSearch
+
+    def _search() -> Dict[str, Any]:
+        search = GoogleSearch(params)
+        search.timeout = provider_timeout(provider)
+        return search.get_dict()
+
+    return call_provider(provider, _search)
+
+def resilience_status() -> Dict[str, Any]:
+    """Estado dos circuit breakers e p95 por provedor (exposto no /ready)."""
+    return {
+        provider: {
+            "circuit": get_breaker(provider).state,
+            "p95_seconds": round(p95, 3) if (p95 := _get_latency(provider).p95()) is not None else None,
+        }
+        for provider in PROVIDERS
+    }
@@ -0,0 +1,108 @@
+from typing import Any
+import orjson
+from pydantic import BaseModel
+from pydantic_core import to_json
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.config import env_bool, env_int
+
+try: # brotli é opcional: sem ele, a negociação cai para gzip
+    import brotli
+except ImportError:
+    brotli = None
+
+# Serialização e compressão das respostas da API.
+# - FastJSONResponse: orjson para dicts/listas e o serializador nativo do Pydantic para
+#   modelos (direto para bytes, sem o dict intermediário do jsonable_encoder + json.dumps).
+# - CompressionMiddleware: br/gzip negociado pelo Accept-Encoding, só acima de um tamanho mínimo.
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def _default(obj: Any) -> Any:
+    # Modelos aninhados em dicts/listas (ex: FinalReport dentro do estado de uma execução)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Tipo não serializável em JSON: {type(obj).__name__}")
+
+def dumps(content: Any) -> bytes:
+    if isinstance(content, BaseModel):
+        return to_json(content)
+    return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse com encoder nativo. Aceita modelos Pydantic diretamente."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+# --- Compressão negociada ---
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int):
+        super().__init__(app, minimum_size)
+        self.quality = quality
+        self._compressor = None
+
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if self._compressor is None:
+            self._compressor = brotli.Compressor(quality=self.quality)
+        # Em respostas em streaming (NDJSON) cada pedaço é liberado assim que chega
+        if more_body:
+            return self._compressor.process(body) + self._compressor.flush()
+        return self._compressor.process(body) + self._compressor.finish()
+
+def _accepted_encodings(header: str) -> dict[str, float]:
+    """'br;q=1.0, gzip;q=0.8, *;q=0' -> {'br': 1.0, 'gzip': 0.8, '*': 0.0}"""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip() == "q":
+            try:
+                q = float(value)
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+def choose_encoding(header: str) -> str | None:
+    """Escolhe br ou gzip conforme o Accept-Encoding (br tem preferência em caso de empate)."""
+    accepted = _accepted_encodings(header)
+    wildcard = accepted.get("*", 0.0)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+class CompressionMiddleware:
+    """Comprime respostas maiores que COMPRESSION_MIN_BYTES com br ou gzip."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.enabled = env_bool("COMPRESSION_ENABLED", True)
+        self.minimum_size = env_int("COMPRESSION_MIN_BYTES", 1024)
+        self.gzip_level = env_int("COMPRESSION_GZIP_LEVEL", 6)
+        self.brotli_quality = env_int("COMPRESSION_BROTLI_QUALITY", 4)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("Accept-Encoding", ""))
+        if encoding == "br":
+            responder = BrotliResponder(self.app, self.minimum_size, self.brotli_quality)
+        elif encoding == "gzip":
+            responder = GZipResponder(self.app, self.minimum_size, compresslevel=self.gzip_level)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+        await responder(scope, receive, send)
@@ -0,0 +1,33 @@
+from functools import lru_cache
+from typing import Dict, Any
+from app.cache import TTLCache
+from app.config import env_int
+
+# Campos do estado do grafo que guardamos por execução (run_id)
+RUN_FIELDS = (
+    "user_request", "origin", "destination", "start_date", "end_date",
+    "raw_flights", "raw_hotels", "raw_activities", "final_report", "error",
+)
+
+@lru_cache(maxsize=1)
+def get_run_store() -> TTLCache:
+    """Resultados brutos das últimas execuções, endereçáveis por run_id (usado pelo /refine)."""
+    return TTLCache(
+        maxsize=env_int("RUN_STORE_MAX_RUNS", 200),
+        ttl_seconds=env_int("RUN_STORE_TTL_SECONDS", 3600),
+        name="runs",
+    )
+
+def save_run(run_id: str, state: Dict[str, Any]) -> None:
+    get_run_store().set(run_id, {field: state.get(field) for field in RUN_FIELDS})
+
+def load_run(run_id: str) -> Dict[str, Any] | None:
+    run = get_run_store().get(run_id)
+    if run is None:
+        # Fora da memória (outro worker ou reinício): recupera do checkpoint SQLite
+        from app.langgraph_app import load_checkpoint_state
+        state = load_checkpoint_state(run_id)
+        if state is not None:
+            save_run(run_id, state)
+            run = get_run_store().get(run_id)
+    return run
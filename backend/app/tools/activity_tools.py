@@ -1,11 +1,21 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+import contextvars
+import itertools
 import os
+import re
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 import requests
 from langchain_core.tools import tool
 from pydantic.v1 import BaseModel, Field
 from app.tools.image_tools import search_image # <-- IMPORTAR A NOVA FERRAMENTA
+from app.cache import cached_lookup, get_places_cache
+from app.config import env_int, env_str
+from app.records import Activity, SearchError
+from app.resilience import ProviderUnavailable, call_provider, provider_timeout
 
 # --- Helper de Coordenadas (Copiado do hotel_tools) ---
+@cached_lookup("geocode")
 def _get_city_coordinates(city_name: str, api_key: str) -> Optional[Dict[str, float]]:
     print(f"Tool (Activity-Helper): Buscando coordenadas para {city_name} (Geoapify Geocoding)")
     GEOCODE_URL = "https://api.geoapify.com/v1/geocode/search"
@@ -15,7 +25,10 @@ def _get_city_coordinates(city_name: str, api_key: str) -> Optional[Dict[str, fl
         "limit": 1
     }
     try:
-        response = requests.get(GEOCODE_URL, params=params)
+        response = call_provider(
+            "geoapify_geocode", requests.get,
+            GEOCODE_URL, params=params, timeout=provider_timeout("geoapify_geocode")
+        )
         response.raise_for_status()
         data = response.json()
         if data.get("features"):
@@ -23,82 +36,219 @@ def _get_city_coordinates(city_name: str, api_key: str) -> Optional[Dict[str, fl
             # Geoapify retorna [lon, lat]
             return {"lon": coords[0], "lat": coords[1]}
         return None
+    except ProviderUnavailable:
+        raise # Provedor degradado: o nó marca a seção em vez de travar o relatório
     except Exception as e:
         print(f"Erro ao buscar coordenadas no Geoapify: {e}")
         return None
 # --- Fim do Helper ---
 
+PLACES_URL = "https://api.geoapify.com/v2/places"
+SEARCH_RADIUS_METERS = 15000 # Raio de 15km
+
+# Modo "single" (anterior): uma consulta com todas as categorias e limit 10
+SINGLE_MODE_CATEGORIES = "tourism.attraction,leisure.park,entertainment.museum,entertainment.zoo,commercial.shopping_mall,catering.restaurant"
+
+# Modo "multi": grupo -> (categorias do Geoapify, cota no resultado final; ACTIVITY_QUOTA_<GRUPO>).
+# Cada grupo é consultado em paralelo e paginado, então restaurantes e shoppings não
+# tomam mais as vagas das atrações. A ordem define a prioridade na deduplicação.
+CATEGORY_GROUPS = {
+    "attractions": ("tourism.attraction,tourism.sights", 6),
+    "museums": ("entertainment.museum,entertainment.culture", 4),
+    "parks": ("leisure.park", 3),
+    "entertainment": ("entertainment.zoo,entertainment.aquarium,entertainment.theme_park", 2),
+    "shopping": ("commercial.shopping_mall", 2),
+    "restaurants": ("catering.restaurant", 3),
+}
+
 class ActivitySearchInput(BaseModel):
     destination: str = Field(description="Cidade ou local de destino para atividades.")
     start_date: str = Field(description="Data de início (usada para contexto, não para filtro de API).")
     end_date: str = Field(description="Data de fim (usada para contexto, não para filtro de API).")
 
-@tool(args_schema=ActivitySearchInput)
-def search_activities(destination: str, **kwargs) -> List[Dict]:
-    """Busca por atrações turísticas na API Geoapify com base no destino."""
-    print(f"Tool: Buscando atividades REAIS (Geoapify) em {destination}...")
+def _places_page(categories: str, coords: Dict[str, float], api_key: str, limit: int, offset: int = 0) -> List[Dict]:
+    params = {
+        "categories": categories,
+        "filter": f"circle:{coords['lon']},{coords['lat']},{SEARCH_RADIUS_METERS}",
+        "bias": f"proximity:{coords['lon']},{coords['lat']}", # Mais próximos do centro primeiro
+        "limit": limit,
+        "offset": offset,
+        "apiKey": api_key
+    }
+    response = call_provider(
+        "geoapify_places", requests.get,
+        PLACES_URL, params=params, timeout=provider_timeout("geoapify_places")
+    )
+    response.raise_for_status() # Isso vai disparar o erro se a URL falhar
+    return response.json().get('features', [])
+
+def _name_key(name: str) -> str:
+    # "Museu Oscar Niemeyer" e "MUSEU OSCAR NIEMEYER " (ou sem acentos) são o mesmo lugar
+    text = unicodedata.normalize("NFKD", name)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w]+", " ", text.lower()).split())
+
+def _group_quota(group: str) -> int:
+    return env_int(f"ACTIVITY_QUOTA_{group.upper()}", CATEGORY_GROUPS[group][1])
+
+def _fetch_group(group: str, coords: Dict[str, float], api_key: str) -> List[Dict]:
+    """
+    Páginas de um grupo até ter lugares com nome suficientes (o dobro da cota, folga para a
+    deduplicação entre grupos). Em cache por cidade: a chave usa as coordenadas do geocoding.
+    """
+    categories = CATEGORY_GROUPS[group][0]
+    page_size = env_int("ACTIVITY_PAGE_SIZE", 20)
+    max_pages = env_int("ACTIVITY_MAX_PAGES", 3)
+    wanted = 2 * _group_quota(group)
+
+    def fetch() -> List[Dict]:
+        features: List[Dict] = []
+        names = set()
+        for page in range(max_pages):
+            batch = _places_page(categories, coords, api_key, page_size, page * page_size)
+            features.extend(batch)
+            names.update(_name_key(name) for f in batch if (name := (f.get('properties') or {}).get('name')))
+            if len(batch) < page_size or len(names) >= wanted:
+                break
+        return features
+
+    key = ("places", group, categories, round(coords["lat"], 4), round(coords["lon"], 4), page_size, max_pages)
+    features, from_cache = get_places_cache().get_or_compute(
+        key, fetch, ttl_seconds=env_int("ACTIVITY_CACHE_TTL_SECONDS", 24 * 3600)
+    )
+    if from_cache:
+        print(f"Tool (Atividades): grupo '{group}' reaproveitado do cache da cidade.")
+    return features
+
+def _select_diverse(by_group: Dict[str, List[Dict]]) -> List[Dict]:
+    """Deduplica por place_id e por nome e aplica as cotas; as vagas que sobram são divididas em rodízio."""
+    seen_ids, seen_names = set(), set()
+    unique: Dict[str, List[Dict]] = {}
+    for group in CATEGORY_GROUPS:
+        unique[group] = []
+        for feature in by_group.get(group, []):
+            props = feature.get('properties') or {}
+            name = props.get('name')
+            if not name:
+                continue # Parques e atrações sem nome não servem de recomendação
+            place_id, name_key = props.get('place_id'), _name_key(name)
+            if (place_id and place_id in seen_ids) or name_key in seen_names:
+                continue
+            if place_id:
+                seen_ids.add(place_id)
+            seen_names.add(name_key)
+            unique[group].append(feature)
+
+    max_results = env_int("ACTIVITY_MAX_RESULTS", 20)
+    selected = [feature for group, features in unique.items() for feature in features[:_group_quota(group)]]
+    leftovers = [features[_group_quota(group):] for group, features in unique.items()]
+    for row in itertools.zip_longest(*leftovers):
+        selected.extend(feature for feature in row if feature is not None)
+    print(f"Tool (Atividades): {sum(map(len, unique.values()))} lugares únicos "
+          f"({', '.join(f'{g}={len(f)}' for g, f in unique.items())}); selecionando {min(len(selected), max_results)}.")
+    return selected[:max_results]
+
+def _search_multi(coords: Dict[str, float], api_key: str) -> Tuple[List[Dict], List[str]]:
+    """
+    Consulta os grupos de categorias em paralelo; um grupo com falha não derruba os demais.
+    Retorna os lugares selecionados e os grupos que falharam (resultado parcial).
+    """
+    by_group: Dict[str, List[Dict]] = {}
+    errors: List[Exception] = []
+    failed: List[str] = []
+    with ThreadPoolExecutor(max_workers=env_int("ACTIVITY_SEARCH_CONCURRENCY", len(CATEGORY_GROUPS))) as pool:
+        futures = {group: pool.submit(contextvars.copy_context().run, _fetch_group, group, coords, api_key)
+                   for group in CATEGORY_GROUPS}
+        for group, future in futures.items():
+            try:
+                by_group[group] = future.result()
+            except Exception as e:
+                print(f"Tool (Atividades): grupo '{group}' falhou ({e}).")
+                errors.append(e)
+                failed.append(group)
+    if errors and not by_group:
+        raise errors[0]
+    return _select_diverse(by_group), failed
+
+def _to_activity(res: Dict, destination: str) -> Activity:
+    props = res.get('properties', {})
+    activity_name = props.get('name', 'Atração não identificada')
+    google_search_url = f"https://www.google.com/search?q={activity_name.replace(' ', '+')}+{destination.replace(' ', '+')}"
+    description = props.get('address_line2', 'Atração local')
+    category = props.get('categories', ['tourism'])[0].split('.')[0]
+    # Coordenadas do local (Geoapify: propriedades lat/lon ou geometria [lon, lat])
+    point = (res.get('geometry') or {}).get('coordinates') or [None, None]
+    lat, lon = props.get('lat', point[1]), props.get('lon', point[0])
+    return Activity(
+        id=google_search_url,
+        title=activity_name,
+        description=description,
+        duration="N/A",
+        price="Verificar no site",
+        capacity=category.capitalize(),
+        # Usadas pela etapa geoespacial (distâncias e roteiro por dia)
+        lat=lat,
+        lon=lon
+    )
+
+def _attach_images(activities: List[Activity], destination: str) -> None:
+    # Uma busca de imagem (SerpAPI, paga) por atividade, em paralelo e limitada a ACTIVITY_IMAGE_LIMIT:
+    # o pool de candidatos pode crescer sem multiplicar as chamadas. A seleção já vem na ordem
+    # de prioridade (cotas por grupo), então as imagens ficam com os candidatos principais.
+    def image_for(activity: Activity) -> str | None:
+        return search_image.invoke({"query": f"{activity.title} {destination}"})
+
+    with_images = activities[:env_int("ACTIVITY_IMAGE_LIMIT", 10)]
+    with ThreadPoolExecutor(max_workers=env_int("ACTIVITY_IMAGE_CONCURRENCY", 6)) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, image_for, activity) for activity in with_images]
+        for activity, future in zip(with_images, futures):
+            activity.image_url = future.result()
+
+def find_activities(destination: str) -> Tuple[List[Activity], List[str]]:
+    """Atividades do destino e os grupos de categorias que falharam (lista vazia se a busca foi completa)."""
+    mode = env_str("ACTIVITY_SEARCH_MODE", "multi").lower()
+    print(f"Tool: Buscando atividades REAIS (Geoapify, modo {mode}) em {destination}...")
     
     try:
         API_KEY = os.environ["GEOAPIFY_API_KEY"]
     except KeyError:
         print("ERRO (Atividades): GEOAPIFY_API_KEY não configurada.")
-        return [{"id": "error", "title": "GEOAPIFY_API_KEY não configurada", "description": "", "duration": "", "price": "R$ 0", "capacity": "", "image_url": None}]
+        raise SearchError("geoapify_places", "not_configured", "GEOAPIFY_API_KEY não configurada")
 
     # 1. Obter coordenadas da cidade
     coords = _get_city_coordinates(destination, API_KEY)
     if not coords:
-        return [{"id": "error", "title": f"Não foi possível encontrar coordenadas para {destination}", "description": "", "duration": "", "price": "R$ 0", "capacity": "", "image_url": None}]
+        raise SearchError("geoapify_geocode", "not_found", f"Não foi possível encontrar coordenadas para {destination}")
 
     # 2. Buscar locais (atrações) perto dessas coordenadas
-    PLACES_URL = "https://api.geoapify.com/v2/places"
-    params = {
-        "categories": "tourism.attraction,leisure.park,entertainment.museum,entertainment.zoo,commercial.shopping_mall,catering.restaurant",
-        "filter": f"circle:{coords['lon']},{coords['lat']},15000", # Raio de 15km
-        "limit": 10, # Reduzido para 10 para limitar chamadas de imagem
-        "apiKey": API_KEY
-    }
-    
+    failed: List[str] = []
     try:
-        response = requests.get(PLACES_URL, params=params)
-        response.raise_for_status() # Isso vai disparar o erro se a URL falhar
-        
-        data = response.json()
-        
-        results = data.get('features', [])
-        formatted_results = []
+        if mode == "multi":
+            results, failed = _search_multi(coords, API_KEY)
+        else:
+            results = _places_page(SINGLE_MODE_CATEGORIES, coords, API_KEY, limit=10) # Reduzido para 10 para limitar chamadas de imagem
+
         if not results:
             print("Geoapify não retornou resultados para atividades.")
-            return []
+            return [], failed
 
         # Mapeia os resultados do Geoapify para o formato ApiActivity
-        for res in results:
-            props = res.get('properties', {})
-            
-            activity_name = props.get('name', 'Atração não identificada')
-            google_search_url = f"https://www.google.com/search?q={activity_name.replace(' ', '+')}+{destination.replace(' ', '+')}"
-            description = props.get('address_line2', 'Atração local')
-            category = props.get('categories', ['tourism'])[0].split('.')[0]
-
-            # --- NOVA ADIÇÃO: BUSCAR IMAGEM ---
-            image_url = search_image.invoke({"query": f"{activity_name} {destination}"})
-            # ------------------------------------
-
-            formatted_results.append({
-                "id": google_search_url, 
-                "title": activity_name,
-                "description": description,
-                "duration": "N/A",
-                "price": "Verificar no site",
-                "capacity": category.capitalize(),
-                "image_url": image_url # <-- ANEXAR A IMAGEM
-            })
-        
+        formatted_results = [_to_activity(res, destination) for res in results]
+        _attach_images(formatted_results, destination)
+
         print(f"Retornando {len(formatted_results)} opções de atividade da Geoapify (com imagens).")
-        return formatted_results
+        return formatted_results, failed
 
+    except ProviderUnavailable:
+        raise
     except requests.exceptions.HTTPError as e:
         print(f"!!! Erro na API Geoapify (Atividades): {e.response.text}")
-        return [{"id": "error", "title": f"Erro na API de atividades: {e.response.text}", "description": "", "duration": "", "price": "R$ 0", "capacity": "", "image_url": None}]
+        raise SearchError("geoapify_places", "api_error", f"Erro na API de atividades: {e.response.text}") from e
     except Exception as e:
         print(f"!!! Erro inesperado (Atividades - Geoapify): {e}")
-        return [{"id": "error", "title": f"Erro ao buscar atividades: {e}", "description": "", "duration": "", "price": "R$ 0", "capacity": "", "image_url": None}]
\ No newline at end of file
+        raise SearchError("geoapify_places", "api_error", f"Erro ao buscar atividades: {e}") from e
+
+@tool(args_schema=ActivitySearchInput)
+def search_activities(destination: str, **kwargs) -> List[Activity]:
+    """Busca por atrações turísticas na API Geoapify com base no destino."""
+    return find_activities(destination)[0]
@@ -1,15 +1,21 @@
 from typing import List, Dict, Optional
 import os
 import json
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
 from langchain_core.tools import tool
 from pydantic.v1 import BaseModel, Field
-from serpapi import GoogleSearch
 from tavily import TavilyClient
-from functools import lru_cache
+from app.cache import cached_lookup, get_price_cache
+from app.config import env_int
+from app.records import Flight, SearchError
+from app.resilience import ProviderUnavailable, call_provider, provider_timeout, serpapi_get_dict
 from app.tools.image_tools import search_image # <-- IMPORTAR FERRAMENTA DE IMAGEM
+from app.tools.normalize import parse_price, parse_duration_minutes
 
 # --- O Helper de IATA (Tavily) ---
-@lru_cache(maxsize=100)
+@cached_lookup("iata")
 def _get_iata_code(city_name: str) -> str | None:
     try:
         tavily_client = TavilyClient(api_key=os.environ["TAVILY_API_KEY"])
@@ -24,7 +30,10 @@ def _get_iata_code(city_name: str) -> str | None:
     """
     
     try:
-        response = tavily_client.search(query=query, search_depth="basic", include_answer=True)
+        response = call_provider(
+            "tavily", tavily_client.search,
+            query=query, search_depth="basic", include_answer=True, timeout=provider_timeout("tavily")
+        )
         answer = response.get('answer')
         
         if answer:
@@ -39,6 +48,8 @@ def _get_iata_code(city_name: str) -> str | None:
         
         print(f"Tavily não retornou 'answer' ou JSON válido para o IATA de {city_name}.")
         return None
+    except ProviderUnavailable:
+        raise # Provedor degradado: o nó marca a seção em vez de travar o relatório
     except Exception as e:
         print(f"Erro ao buscar/processar IATA com Tavily: {e}")
         return None
@@ -53,7 +64,7 @@ class FlightSearchInput(BaseModel):
     passengers: int = Field(default=1, description="Número de passageiros.")
 
 @tool(args_schema=FlightSearchInput)
-def search_flights(origin: str, destination: str, departure_date: str, **kwargs) -> List[Dict]:
+def search_flights(origin: str, destination: str, departure_date: str, **kwargs) -> List[Flight]:
     """Busca por voos usando a API Google Flights da SerpAPI e anexa uma imagem da companhia."""
     print(f"Tool: Buscando voos REAIS (SerpAPI Google Flights) de {origin} para {destination}...")
     
@@ -66,16 +77,15 @@ def search_flights(origin: str, destination: str, departure_date: str, **kwargs)
             raise KeyError("TAVILY_API_KEY não configurada no .env")
             
     except KeyError as e:
-        error_msg = f"{e.args[0]} não configurada."
-        return [{"id": "error", "airline": error_msg, "departure": "", "arrival": "", "duration": "", "price": "R$ 0", "stops": 0, "image_url": None}]
+        raise SearchError("serpapi_flights", "not_configured", f"{e.args[0]} não configurada.")
 
     origin_iata = _get_iata_code(origin)
     dest_iata = _get_iata_code(destination)
 
     if not origin_iata:
-        return [{"id": "error", "airline": f"Não foi possível encontrar o código IATA para a origem: {origin}", "departure": "", "arrival": "", "duration": "", "price": "R$ 0", "stops": 0, "image_url": None}]
+        raise SearchError("tavily", "not_found", f"Não foi possível encontrar o código IATA para a origem: {origin}")
     if not dest_iata:
-        return [{"id": "error", "airline": f"Não foi possível encontrar o código IATA para o destino: {destination}", "departure": "", "arrival": "", "duration": "", "price": "R$ 0", "stops": 0, "image_url": None}]
+        raise SearchError("tavily", "not_found", f"Não foi possível encontrar o código IATA para o destino: {destination}")
 
     params = {
         "engine": "google_flights",
@@ -93,13 +103,12 @@ def search_flights(origin: str, destination: str, departure_date: str, **kwargs)
         params["return_date"] = return_date
 
     try:
-        search = GoogleSearch(params)
-        results = search.get_dict()
+        results = serpapi_get_dict("serpapi_flights", params)
         
         if "error" in results:
             error_msg = results["error"]
             print(f"!!! Erro da SerpAPI (Voos): {error_msg}")
-            return [{"id": "error", "airline": f"Erro na API de voos: {error_msg}", "departure": "", "arrival": "", "duration": "", "price": "R$ 0", "stops": 0, "image_url": None}]
+            raise SearchError("serpapi_flights", "api_error", f"Erro na API de voos: {error_msg}")
 
         formatted_results = []
         data_to_parse = results.get("best_flights", [])
@@ -131,20 +140,168 @@ def search_flights(origin: str, destination: str, departure_date: str, **kwargs)
             image_url = search_image.invoke({"query": f"{airline_name} logo"})
             # ----------------------------------------------
 
-            formatted_results.append({
-                "id": flight.get("google_flights_url", "default_id"),
-                "airline": airline_name,
-                "departure": departure_time,
-                "arrival": arrival_time,
-                "duration": flight.get("total_duration", "N/A"),
-                "price": f"R$ {flight.get('price', 0)}", 
-                "stops": flight.get("stops", 0),
-                "image_url": image_url # <-- ANEXAR A IMAGEM
-            })
+            formatted_results.append(Flight(
+                id=flight.get("google_flights_url", "default_id"),
+                airline=airline_name,
+                departure=departure_time,
+                arrival=arrival_time,
+                duration=str(flight.get("total_duration", "N/A")),
+                price=f"R$ {flight.get('price', 0)}",
+                stops=flight.get("stops", 0),
+                image_url=image_url, # <-- ANEXAR A IMAGEM
+                # Campos numéricos para filtrar/ordenar no servidor (/refine)
+                price_value=parse_price(flight.get("price")),
+                duration_minutes=parse_duration_minutes(flight.get("total_duration"))
+            ))
         
         print(f"Retornando {len(formatted_results)} opções de voo da SerpAPI (com imagens).")
         return formatted_results[:10]
 
+    except (ProviderUnavailable, SearchError):
+        raise
     except Exception as e:
         print(f"Erro inesperado (Voos - SerpAPI): {e}")
-        return [{"id": "error", "airline": f"Erro ao buscar voos na SerpAPI: {e}", "departure": "", "arrival": "", "duration": "", "price": "R$ 0", "stops": 0, "image_url": None}]
\ No newline at end of file
+        raise SearchError("serpapi_flights", "api_error", f"Erro ao buscar voos na SerpAPI: {e}") from e
+
+
+# --- Calendário de preços (datas flexíveis) ---
+
+class FlexibleFlightSearchInput(BaseModel):
+    origin: str = Field(description="Cidade ou aeroporto de origem.")
+    destination: str = Field(description="Cidade ou aeroporto de destino.")
+    departure_date: str = Field(description="Data de partida de referência (AAAA-MM-DD).")
+    return_date: str = Field(description="Data de retorno de referência (AAAA-MM-DD).")
+    flex_days: int = Field(default=3, ge=0, le=7, description="Variação de ±N dias em cada data.")
+    max_queries: int = Field(default=20, ge=1, le=100, description="Máximo de consultas novas à SerpAPI.")
+    passengers: int = Field(default=1, description="Número de passageiros.")
+
+def _cheapest_price(results: Dict) -> float | None:
+    """Menor preço de ida e volta numa resposta do Google Flights."""
+    prices = [
+        parse_price(flight.get("price"))
+        for flight in results.get("best_flights", []) + results.get("other_flights", [])
+    ]
+    prices = [p for p in prices if p is not None]
+    if prices:
+        return min(prices)
+    return parse_price(results.get("price_insights", {}).get("lowest_price"))
+
+def _calendar_cell_price(origin_iata: str, dest_iata: str, departure: str, return_: str, passengers: int, api_key: str) -> float | None:
+    params = {
+        "engine": "google_flights",
+        "api_key": api_key,
+        "departure_id": origin_iata,
+        "arrival_id": dest_iata,
+        "outbound_date": departure,
+        "return_date": return_,
+        "adults": passengers,
+        "currency": "BRL",
+        "hl": "pt-br",
+        "gl": "br"
+    }
+    results = serpapi_get_dict("serpapi_flights", params)
+    if "error" in results:
+        print(f"!!! Erro da SerpAPI (Calendário {departure}/{return_}): {results['error']}")
+        return None
+    return _cheapest_price(results)
+
+def _shift(day: str, offset: int) -> str:
+    return (date.fromisoformat(day) + timedelta(days=offset)).isoformat()
+
+@tool(args_schema=FlexibleFlightSearchInput)
+def search_flight_price_calendar(origin: str, destination: str, departure_date: str, return_date: str,
+                                 flex_days: int = 3, max_queries: int = 20, passengers: int = 1) -> Dict:
+    """
+    Monta uma matriz de preços (partida x retorno) variando as datas em ±flex_days,
+    consultando o Google Flights em paralelo. Células já consultadas vêm do cache e
+    não contam para o limite de consultas; as mais próximas das datas pedidas têm prioridade.
+    """
+    print(f"Tool: Calendário de preços (SerpAPI) de {origin} para {destination} (±{flex_days} dias)...")
+    try:
+        SERPAPI_KEY = os.environ["SERPAPI_API_KEY"]
+        if "TAVILY_API_KEY" not in os.environ:
+            raise KeyError("TAVILY_API_KEY não configurada no .env")
+    except KeyError as e:
+        return {"error": f"{e.args[0]} não configurada."}
+
+    try:
+        date.fromisoformat(departure_date)
+        date.fromisoformat(return_date)
+    except ValueError:
+        return {"error": f"Datas inválidas: {departure_date} / {return_date}"}
+
+    origin_iata = _get_iata_code(origin)
+    dest_iata = _get_iata_code(destination)
+    if not origin_iata or not dest_iata:
+        return {"error": f"Não foi possível encontrar o código IATA para {origin if not origin_iata else destination}"}
+
+    offsets = range(-flex_days, flex_days + 1)
+    departures = [_shift(departure_date, i) for i in offsets]
+    returns = [_shift(return_date, j) for j in offsets]
+    today = date.today().isoformat()
+
+    # Células válidas (retorno depois da partida, partida no futuro), das mais próximas às mais distantes
+    cells = sorted(
+        ((abs(i) + abs(j), dep, ret) for i, dep in zip(offsets, departures) for j, ret in zip(offsets, returns)
+         if ret > dep and dep >= today),
+        key=lambda cell: cell[0],
+    )
+
+    cache = get_price_cache()
+    prices: Dict[tuple, float | None] = {}
+    to_query = []
+    for _, dep, ret in cells:
+        key = ("calendar", origin_iata, dest_iata, dep, ret, passengers)
+        cached = cache.get(key)
+        if cached is not None:
+            prices[(dep, ret)] = cached
+        elif len(to_query) < max_queries:
+            to_query.append((key, dep, ret))
+    cached_count = len(prices)
+    # Células cuja consulta falhou (None na matriz por erro, não por falta de voo)
+    failed: List[tuple] = []
+
+    def query(key, dep, ret):
+        # Uma célula com falha não derruba a matriz: fica sem preço e entra em `failed`
+        try:
+            price, _ = cache.get_or_compute(
+                key, lambda: _calendar_cell_price(origin_iata, dest_iata, dep, ret, passengers, SERPAPI_KEY),
+                should_cache=lambda value: value is not None,
+            )
+            return price
+        except ProviderUnavailable as e:
+            print(f"Calendário: célula {dep}/{ret} sem preço ({e.reason}).")
+        except Exception as e:
+            print(f"!!! Calendário: erro na célula {dep}/{ret}: {e}")
+        failed.append((dep, ret))
+        return None
+
+    # Pool próprio (as chamadas em si passam pelo pool da camada de resiliência)
+    with ThreadPoolExecutor(max_workers=env_int("CALENDAR_MAX_CONCURRENCY", 6)) as pool:
+        futures = {
+            (dep, ret): pool.submit(contextvars.copy_context().run, query, key, dep, ret)
+            for key, dep, ret in to_query
+        }
+        for cell, future in futures.items():
+            prices[cell] = future.result()
+
+    matrix = [[prices.get((dep, ret)) for ret in returns] for dep in departures]
+    priced = sorted(
+        ({"departure_date": dep, "return_date": ret, "price": price} for (dep, ret), price in prices.items() if price is not None),
+        key=lambda item: item["price"],
+    )
+    print(f"Calendário: {len(to_query)} consultas, {cached_count} do cache, {len(priced)} células com preço, {len(failed)} com falha.")
+    return {
+        "origin": origin_iata,
+        "destination": dest_iata,
+        "departure_dates": departures,
+        "return_dates": returns,
+        "prices": matrix,
+        "cheapest": priced[:5],
+        "queried": len(to_query),
+        "cached": cached_count,
+        "skipped": len(cells) - len(to_query) - cached_count,
+        # None em `prices` com a célula aqui = provedor falhou; sem a célula = não há voo
+        "failed": len(failed),
+        "failed_cells": [{"departure_date": dep, "return_date": ret} for dep, ret in sorted(failed)],
+    }
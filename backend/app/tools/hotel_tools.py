@@ -1,11 +1,14 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+from datetime import date
 import os
 import requests
 from langchain_core.tools import tool
 from pydantic.v1 import BaseModel, Field
-from serpapi import GoogleSearch
+from app.records import Hotel, SearchError
+from app.resilience import ProviderUnavailable, serpapi_get_dict
 import re
 from app.tools.image_tools import search_image # <-- IMPORTAR A NOVA FERRAMENTA
+from app.tools.normalize import parse_price, parse_rating
 
 # --- Esquema de Input (sem mudança) ---
 class HotelSearchInput(BaseModel):
@@ -13,8 +16,33 @@ class HotelSearchInput(BaseModel):
     check_in_date: str = Field(description="Data de check-in no formato AAAA-MM-DD.")
     check_out_date: str = Field(description="Data de check-out no formato AAAA-MM-DD.")
 
+def _nightly_price(hotel: Dict, nights: int) -> Tuple[str, float | None]:
+    """
+    Preço de exibição e preço numérico POR NOITE. Sem rate_per_night, o total da estadia
+    (total_rate) é dividido pelas noites, para que filtros e ordenação (/refine) comparem
+    sempre a mesma grandeza entre hotéis.
+    """
+    # Campo estruturado rate_per_night -> lowest
+    rate_info = hotel.get("rate_per_night") or {}
+    if rate_info.get("lowest") or rate_info.get("extracted_lowest"):
+        price_str = rate_info.get("lowest") or f"R$ {rate_info['extracted_lowest']}"
+        return price_str, parse_price(rate_info.get("extracted_lowest") or price_str)
+
+    # Só o preço total: exibe como total e normaliza o valor numérico para a diária
+    total_rate = hotel.get("total_rate") or {}
+    if total_rate.get("lowest") or total_rate.get("extracted_lowest"):
+        total_str = total_rate.get("lowest") or f"R$ {total_rate['extracted_lowest']}"
+        total = parse_price(total_rate.get("extracted_lowest") or total_str)
+        return f"{total_str} (total da estadia)", round(total / max(nights, 1), 2) if total else None
+
+    # Fallback final para lógica antiga (texto "R$ 300 por noite, R$ 1.500 total")
+    price_str = hotel.get("price", "Verificar no site")
+    if "total" in price_str:
+        price_str = price_str.split("total")[0].strip()
+    return price_str, parse_price(price_str)
+
 @tool(args_schema=HotelSearchInput)
-def search_hotels(destination: str, check_in_date: str, check_out_date: str) -> List[Dict]:
+def search_hotels(destination: str, check_in_date: str, check_out_date: str) -> List[Hotel]:
     """Busca por hotéis usando a API Google Hotels da SerpAPI e anexa uma imagem."""
     print(f"Tool: Buscando hotéis REAIS (SerpAPI Google Hotels) em {destination}...")
     
@@ -22,7 +50,7 @@ def search_hotels(destination: str, check_in_date: str, check_out_date: str) ->
         API_KEY = os.environ["SERPAPI_API_KEY"]
     except KeyError:
         print("ERRO (Hotéis): SERPAPI_API_KEY não configurada.")
-        return [{"id": "error", "name": "SERPAPI_API_KEY não configurada.", "location": "", "rating": 0, "price": "R$ 0", "amenities": [], "image_url": None}]
+        raise SearchError("serpapi_hotels", "not_configured", "SERPAPI_API_KEY não configurada.")
 
     params = {
         "engine": "google_hotels",
@@ -37,13 +65,12 @@ def search_hotels(destination: str, check_in_date: str, check_out_date: str) ->
     }
     
     try:
-        search = GoogleSearch(params)
-        results = search.get_dict()
+        results = serpapi_get_dict("serpapi_hotels", params)
         
         if "error" in results:
             error_msg = results["error"]
             print(f"!!! Erro da SerpAPI (Hotéis): {error_msg}")
-            return [{"id": "error", "name": f"Erro na API de hotéis: {error_msg}", "location": "", "rating": 0, "price": "R$ 0", "amenities": [], "image_url": None}]
+            raise SearchError("serpapi_hotels", "api_error", f"Erro na API de hotéis: {error_msg}")
 
         formatted_results = []
         data_to_parse = results.get("properties", [])
@@ -52,27 +79,18 @@ def search_hotels(destination: str, check_in_date: str, check_out_date: str) ->
             print("SerpAPI (Hotéis) não retornou 'properties', mas não reportou erro.")
             return []
 
+        try:
+            nights = (date.fromisoformat(check_out_date) - date.fromisoformat(check_in_date)).days
+        except ValueError:
+            nights = 1
+
         # Limitamos a 5-7 para não fazer tantas chamadas de imagem
         for hotel in data_to_parse[:7]: 
             
             hotel_link = hotel.get("link", f"https://www.google.com/search?q={hotel.get('name', 'hotel').replace(' ', '+')}+{destination.replace(' ', '+')}")
             
-            # --- LÓGICA DE PREÇO ATUALIZADA ---
-            # Tenta pegar do campo estruturado rate_per_night -> lowest
-            rate_info = hotel.get("rate_per_night", {})
-            price_str = rate_info.get("lowest")
-            
-            # Se não achar, tenta pegar o preço total
-            if not price_str:
-                total_rate = hotel.get("total_rate", {})
-                price_str = total_rate.get("lowest")
-
-            # Fallback final para lógica antiga se ainda for None
-            if not price_str:
-                price_str = hotel.get("price", "Verificar no site")
-                if "total" in price_str:
-                     price_str = price_str.split("total")[0].strip()
-            # ----------------------------------
+            # Preço por noite (exibição e valor numérico vêm do mesmo campo)
+            price_str, price_value = _nightly_price(hotel, nights)
 
             amenities_list = hotel.get("highlights", []) 
             if not amenities_list and hotel.get("description"):
@@ -84,19 +102,28 @@ def search_hotels(destination: str, check_in_date: str, check_out_date: str) ->
             image_url = search_image.invoke({"query": f"{hotel_name} {destination}"})
             # ------------------------------------
 
-            formatted_results.append({
-                "id": hotel_link,
-                "name": hotel_name,
-                "location": hotel.get("vicinity", hotel.get("address", destination)),
-                "rating": int(hotel.get("rating", 0) or 0),
-                "price": price_str,
-                "amenities": amenities_list,
-                "image_url": image_url # <-- ANEXAR A IMAGEM
-            })
+            formatted_results.append(Hotel(
+                id=hotel_link,
+                name=hotel_name,
+                location=hotel.get("vicinity", hotel.get("address", destination)),
+                rating=int(hotel.get("rating", 0) or 0),
+                price=price_str,
+                amenities=amenities_list,
+                image_url=image_url, # <-- ANEXAR A IMAGEM
+                # Campos numéricos para filtrar/ordenar no servidor (/refine)
+                price_value=price_value,
+                rating_value=parse_rating(hotel.get("overall_rating", hotel.get("rating"))),
+                stars=hotel.get("extracted_hotel_class"),
+                # Coordenadas para as distâncias até as atividades (etapa geoespacial)
+                lat=(hotel.get("gps_coordinates") or {}).get("latitude"),
+                lon=(hotel.get("gps_coordinates") or {}).get("longitude")
+            ))
         
         print(f"Retornando {len(formatted_results)} opções de hotel da SerpAPI (com imagens).")
         return formatted_results
 
+    except (ProviderUnavailable, SearchError):
+        raise # Provedor degradado ou erro: o nó marca a seção em vez de travar o relatório
     except Exception as e:
         print(f"Erro inesperado (Hotéis - SerpAPI): {e}")
-        return [{"id": "error", "name": f"Erro ao buscar hotéis: {e}", "location": "", "rating": 0, "price": "R$ 0", "amenities": [], "image_url": None}]
\ No newline at end of file
+        raise SearchError("serpapi_hotels", "api_error", f"Erro ao buscar hotéis: {e}") from e
\ No newline at end of file
@@ -2,14 +2,14 @@ from typing import List, Dict, Optional
 import os
 from langchain_core.tools import tool
 from pydantic.v1 import BaseModel, Field
-from serpapi import GoogleSearch
-from functools import lru_cache
+from app.resilience import serpapi_get_dict
+from app.cache import cached_lookup
 
 class ImageSearchInput(BaseModel):
     query: str = Field(description="O termo de busca para a imagem (ex: 'Qoya Hotel Curitiba', 'Museu Oscar Niemeyer').")
 
-# Usamos um cache simples para não buscar a mesma imagem várias vezes na mesma execução
-@lru_cache(maxsize=50)
+# Cache compartilhado para não buscar a mesma imagem várias vezes (entre execuções)
+@cached_lookup("image")
 def _search_google_images(query: str, api_key: str) -> List[str]:
     """Função auxiliar interna com cache para buscar imagens no SerpAPI."""
     print(f"Tool (Image-Helper): Buscando imagens (SerpAPI) para '{query}'...")
@@ -25,8 +25,8 @@ def _search_google_images(query: str, api_key: str) -> List[str]:
     }
     
     try:
-        search = GoogleSearch(params)
-        results = search.get_dict()
+        # Imagens são opcionais: prazo curto, hedge e circuit breaker; falhas viram "sem imagem"
+        results = serpapi_get_dict("serpapi_images", params)
         
         if "error" in results:
             print(f"!!! Erro da SerpAPI (Imagens): {results['error']}")
@@ -0,0 +1,65 @@
+import re
+
+# Helpers para converter os campos "de exibição" das APIs em valores numéricos
+# (usados para filtrar/ordenar no servidor sem chamar as ferramentas de novo).
+
+_NUMBER_RE = re.compile(r"\d[\d.,]*")
+_HOURS_RE = re.compile(r"(\d+)\s*(?:h|hr|hrs|hora|horas)\b", re.IGNORECASE)
+_MINUTES_RE = re.compile(r"(\d+)\s*(?:m|min|mins|minuto|minutos)\b", re.IGNORECASE)
+
+def parse_price(value) -> float | None:
+    """Converte "R$ 1.234,56", "R$ 1234", "$120" ou 1234 em float. Retorna None se não houver número."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if value > 0 else None
+    match = _NUMBER_RE.search(str(value))
+    if not match:
+        return None
+    number = match.group(0).rstrip(".,")
+    if "," in number and "." in number:
+        # O último separador é o decimal: "1.234,56" (pt-BR) ou "1,234.56" (en)
+        if number.rfind(",") > number.rfind("."):
+            number = number.replace(".", "").replace(",", ".")
+        else:
+            number = number.replace(",", "")
+    elif "," in number:
+        # "1234,56" -> decimal; "1,234" -> milhar
+        integer, _, fraction = number.rpartition(",")
+        number = f"{integer.replace(',', '')}.{fraction}" if len(fraction) != 3 else number.replace(",", "")
+    elif number.count(".") > 1 or (number.count(".") == 1 and len(number.rpartition(".")[2]) == 3):
+        # "1.234" ou "1.234.567" -> separador de milhar
+        number = number.replace(".", "")
+    try:
+        price = float(number)
+    except ValueError:
+        return None
+    return price if price > 0 else None
+
+def parse_duration_minutes(value) -> int | None:
+    """Converte 95, "95", "1 h 35 min" ou "2h" em minutos."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value) if value > 0 else None
+    text = str(value).strip()
+    if text.isdigit():
+        return int(text) or None
+    hours = _HOURS_RE.search(text)
+    minutes = _MINUTES_RE.search(text)
+    if not hours and not minutes:
+        return None
+    total = (int(hours.group(1)) * 60 if hours else 0) + (int(minutes.group(1)) if minutes else 0)
+    return total or None
+
+def parse_rating(value) -> float | None:
+    """Converte 4.5, "4,5" ou "4.5/5" em float."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if value > 0 else None
+    match = re.search(r"\d+(?:[.,]\d+)?", str(value))
+    if not match:
+        return None
+    rating = float(match.group(0).replace(",", "."))
+    return rating if rating > 0 else None
@@ -0,0 +1,319 @@
+"""
+Benchmarks do backend.
+
+Uso (a partir da pasta backend):
+    python benchmark.py            # roda todas as seções
+    python benchmark.py import     # roda apenas a seção indicada
+
+Nenhuma seção chama as APIs externas (Gemini, SerpAPI, Tavily, Geoapify).
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Nunca escrever no banco real durante os benchmarks
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'travel_app_bench.db')}")
+
+# --- Seção: tempo de import / startup ---
+
+def _importtime_profile(module: str) -> list[tuple[int, int, str]]:
+    """Roda `python -X importtime -c 'import <module>'` num processo limpo e retorna (self_us, cumulative_us, nome)."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        head, cumulative_us, name = line.split("|", 2)
+        try:
+            rows.append((int(head.split(":")[1]), int(cumulative_us), name[1:]))
+        except ValueError:
+            continue
+    return rows
+
+def bench_import(top: int = 10) -> None:
+    print("=== Import-time profile (app.main) ===")
+    start = time.perf_counter()
+    rows = _importtime_profile("app.main")
+    wall = time.perf_counter() - start
+    if not rows:
+        print("Falha ao coletar o perfil de import.")
+        return
+    total = next((cum for _, cum, name in rows if name == "app.main"), max(cum for _, cum, _ in rows))
+    print(f"import app.main: {total / 1000:.1f} ms (processo completo: {wall * 1000:.0f} ms)")
+    # Imports diretos do app.main (um nível de indentação) mostram onde está o custo
+    direct = [(cum, name.strip()) for _, cum, name in rows if name.startswith("  ") and not name.startswith("    ")]
+    print(f"Top {top} imports diretos (cumulativo):")
+    for cum, name in sorted(direct, reverse=True)[:top]:
+        print(f"  {cum / 1000:9.1f} ms  {name}")
+
+    # Quanto custa aquecer o grafo (sem LLM, que depende de chave)
+    sys.path.insert(0, BACKEND_DIR)
+    from app.langgraph_app import get_app
+    start = time.perf_counter()
+    get_app()
+    print(f"Compilação do grafo (get_app, 1ª chamada): {(time.perf_counter() - start) * 1000:.1f} ms")
+    print()
+
+# --- Seção: serialização e compressão das respostas ---
+
+def _sample_report(seed: int = 0):
+    """FinalReport com o formato de uma resposta real: blobs `data` completos e URLs longas.
+
+    `seed` varia ids, preços, destinos e textos, para que relatórios diferentes não se repitam
+    (cópias idênticas inflariam a taxa de compressão da lista de relatórios).
+    """
+    import random
+    import hashlib
+    from app.langgraph_app import FinalReport, CuratedRecommendation
+
+    def token(*parts) -> str:
+        # Trechos únicos por item, como os tokens das URLs reais (não comprimem entre si)
+        return hashlib.sha256(repr((seed, *parts)).encode()).hexdigest()
+
+    rng = random.Random(seed)
+    cities = ["Curitiba", "Florianópolis", "Salvador", "Recife", "Gramado", "Porto Alegre", "Belo Horizonte", "Natal"]
+    streets = ["Rua XV de Novembro", "Av. Beira-Mar", "Rua das Flores", "Av. Atlântica", "Rua da Praia", "Av. Sete de Setembro"]
+    blurbs = ["Localização excelente, a poucos passos das principais atrações.", "Vista para o mar e café da manhã regional.",
+              "Próximo ao centro histórico e a restaurantes locais.", "Ambiente tranquilo, ideal para famílias.",
+              "Fácil acesso ao transporte público e ao aeroporto.", "Quartos amplos recém-reformados."]
+    amenities = ["Wi-Fi gratuito", "Café da manhã", "Piscina", "Academia", "Estacionamento", "Spa", "Bar", "Pet friendly"]
+    city = rng.choice(cities)
+
+    def item(kind: str, i: int) -> dict:
+        link = "https://www.google.com/travel/flights/booking?tfs=" + "".join(token(kind, i, n) for n in range(4))
+        price = rng.randint(150, 4000)
+        rating = round(rng.uniform(3.5, 5.0), 1)
+        return {
+            "id": f"{kind}-{seed}-{i}", "name": f"{kind.title()} {rng.choice(streets).split(' ', 1)[1]} {rng.randint(1, 999)}",
+            "price": f"R$ {price},00", "price_value": float(price), "rating": rating, "rating_value": rating,
+            "stars": rng.randint(2, 5),
+            "address": f"{rng.choice(streets)}, {rng.randint(1, 3000)} - Centro, {city}, {rng.randint(10000, 99999)}-{rng.randint(100, 999)}, Brasil",
+            "link": link,
+            "images": [f"https://serpapi.com/searches/{token(kind, i)[:24]}/images/{token(kind, i, n)}.jpeg" for n in range(6)],
+            "amenities": rng.sample(amenities, rng.randint(3, 6)),
+            "description": " ".join(rng.sample(blurbs, 4)),
+        }
+
+    return FinalReport(
+        summary_text=f"Sua viagem de São Paulo para {city} de {rng.randint(1, 20):02d} a {rng.randint(21, 28):02d} de novembro. "
+                     + " ".join(rng.sample(blurbs, 3)),
+        curated_flights=[CuratedRecommendation(data=item("voo", i), justification="Melhor preço direto.") for i in range(2)],
+        curated_hotels=[CuratedRecommendation(data=item("hotel", i), justification="Ótima nota e localização.") for i in range(3)],
+        curated_activities=[CuratedRecommendation(data=item("atividade", i), justification="Imperdível.") for i in range(5)],
+        closing_text="Boa viagem!",
+    )
+
+def _time_us(fn, iterations: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def bench_serialization(iterations: int = 300, reports_count: int = 50) -> None:
+    import gzip
+    import json
+    sys.path.insert(0, BACKEND_DIR)
+    from fastapi.encoders import jsonable_encoder
+    from app.database import Base, SessionLocal, engine
+    from app.main import TripDataResponse, REPORT_FIELDS, REPORTS_ADAPTER
+    from app.models import Report
+    from app.responses import brotli, dumps
+
+    def stdlib(content) -> bytes:
+        # Caminho anterior: jsonable_encoder + json.dumps do JSONResponse do Starlette
+        return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+    report = _sample_report()
+    trip = TripDataResponse(final_report=report, origin="São Paulo", destination="Curitiba",
+                            start_date="2026-11-05", end_date="2026-11-10", run_id="bench")
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        db.query(Report).filter(Report.user_id == -1).delete()
+        db.add_all([Report(user_id=-1, origin="São Paulo", destination="Curitiba", start_date="2026-11-05",
+                           end_date="2026-11-10", content=_sample_report(seed).model_dump()) for seed in range(1, reports_count + 1)])
+        db.commit()
+        load_orm = lambda: db.query(Report).filter(Report.user_id == -1).all()
+        load_rows = lambda: [dict(row._mapping) for row in
+                             db.query(*(getattr(Report, f) for f in REPORT_FIELDS)).filter(Report.user_id == -1).all()]
+        cases = [
+            ("POST /plan-trip (TripDataResponse)",
+             lambda: stdlib(trip), lambda: trip.model_dump_json().encode(), "encoder nativo (FastJSON):    ", lambda: dumps(trip)),
+            (f"GET /reports ({reports_count} relatórios, inclui a consulta)",
+             lambda: stdlib(load_orm()), None, "ReportOut validado + dump_json:", lambda: REPORTS_ADAPTER.dump_json(REPORTS_ADAPTER.validate_python(load_rows()))),
+        ]
+        print(f"=== Serialização das respostas ({iterations} iterações) ===")
+        for label, before, pydantic_path, after_label, after in cases:
+            body = after()
+            assert json.loads(body) == json.loads(before()), label
+            iters = iterations if pydantic_path else max(10, iterations // 10)
+            before_us, after_us = _time_us(before, iters), _time_us(after, iters)
+            print(label)
+            print(f"  jsonable_encoder + json.dumps: {before_us:9.1f} us")
+            if pydantic_path:
+                print(f"  model_dump_json (Pydantic):    {_time_us(pydantic_path, iters):9.1f} us")
+            print(f"  {after_label} {after_us:9.1f} us  ({before_us / after_us:.1f}x)")
+            sizes = f"  bytes: identidade {len(body):,} | gzip-6 {len(gzip.compress(body, 6)):,}"
+            if brotli is not None:
+                sizes += f" | br-4 {len(brotli.compress(body, quality=4)):,}"
+            print(sizes)
+        db.query(Report).filter(Report.user_id == -1).delete()
+        db.commit()
+    finally:
+        db.close()
+    print()
+
+# --- Seção: memória por plano (execuções simultâneas) ---
+
+def _fake_rows(section: str, count: int) -> list:
+    """Resultados com o tamanho dos reais (URLs longas do Google), como dicts."""
+    rows = []
+    for i in range(count):
+        link = f"https://www.google.com/travel/{section}?q=" + "x" * 180 + str(i)
+        image = f"https://serpapi.com/searches/{i:024d}/images/{'a' * 64}.jpeg"
+        if section == "flights":
+            rows.append({"id": link, "airline": "Azul", "departure": "Ida: 2026-11-05 08:15", "arrival": "Volta: 2026-11-10 19:40",
+                         "duration": "65", "price": f"R$ {900 + i}", "stops": i % 2, "image_url": image,
+                         "price_value": 900.0 + i, "duration_minutes": 65})
+        elif section == "hotels":
+            rows.append({"id": link, "name": f"Hotel {i} Centro", "location": "Rua XV de Novembro, Centro", "rating": 4,
+                         "price": f"R$ {300 + i}", "amenities": ["Wi-Fi gratuito", "Café da manhã", "Piscina"],
+                         "image_url": image, "price_value": 300.0 + i, "rating_value": 4.5, "stars": 4,
+                         "lat": -25.43 + i * 0.004, "lon": -49.27 + i * 0.003})
+        else:
+            rows.append({"id": link, "title": f"Atração {i}", "description": "Centro, Curitiba - PR, Brasil",
+                         "duration": "N/A", "price": "Verificar no site", "capacity": "Tourism", "image_url": image,
+                         "lat": -25.42 - i * 0.003, "lon": -49.26 + i * 0.002})
+    return rows
+
+# Quantidade de resultados por ferramenta em cada plano do benchmark
+MEMORY_ROWS = {"flights": 10, "hotels": 7, "activities": 40}
+
+def _memory_worker(concurrency: int) -> None:
+    """Roda `concurrency` planos simultâneos (LLM stub, ferramentas falsas) e imprime o pico de RSS."""
+    import resource
+    from concurrent.futures import ThreadPoolExecutor
+    sys.path.insert(0, BACKEND_DIR)
+    from app.database import init_db
+    from app.records import from_dict
+    from app.run_store import load_run
+    import app.main as main
+    import app.tools.activity_tools as activity_tools
+    import app.tools.flight_tools as flight_tools
+    import app.tools.hotel_tools as hotel_tools
+
+    def fake_records(section: str) -> list:
+        # Cada plano recebe registros novos, como numa busca real
+        return [from_dict(section, row) for row in _fake_rows(section, MEMORY_ROWS[section])]
+
+    class FakeTool:
+        def __init__(self, section: str):
+            self.section = section
+
+        def invoke(self, args):
+            return fake_records(self.section)
+
+    # Todos os pontos de entrada que os nós usam (as atividades vêm de find_activities)
+    flight_tools.search_flights = FakeTool("flights")
+    hotel_tools.search_hotels = FakeTool("hotels")
+    activity_tools.search_activities = FakeTool("activities")
+    activity_tools.find_activities = lambda destination: (fake_records("activities"), [])
+    init_db()
+
+    def plan(i: int):
+        request = f"Planeje uma viagem de São Paulo para Cidade {i} de 2026-11-05 até 2026-11-10"
+        return main._execute_plan(request, f"bench-memory-{concurrency}-{i}-{time.time_ns()}")
+
+    import contextlib, io
+    with contextlib.redirect_stdout(io.StringIO()):
+        plan(-1) # aquece imports, grafo e LLM antes da linha de base
+        baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(plan, range(concurrency)))
+        elapsed = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Os números só valem se cada plano passou de fato pelas ferramentas falsas e pelo roteiro
+    for r in results:
+        run = load_run(r.run_id)
+        assert r.final_report and not r.degraded_sections, r
+        assert r.itinerary and r.itinerary["days"], r.run_id
+        for section, count in MEMORY_ROWS.items():
+            assert len(run[f"raw_{section}"]) == count, (section, len(run[f"raw_{section}"]))
+    print(f"{baseline_kb} {peak_kb} {elapsed:.3f}")
+
+def bench_memory(levels=(1, 8, 32)) -> None:
+    import tracemalloc
+    sys.path.insert(0, BACKEND_DIR)
+    from app.records import from_dict
+
+    print("=== Memória dos resultados e pico de RSS por plano ===")
+    # 1. Representação: dicts das ferramentas x registros com __slots__
+    print("Bytes por item (tracemalloc, 1000 itens; só o contêiner, os textos são compartilhados):")
+    # As atividades ganham 6 campos na etapa geoespacial (o registro já reserva esses slots)
+    geo = {"distance_to_center_km": 2.4, "nearest_hotel_id": "h1", "nearest_hotel_km": 1.0,
+           "day": 1, "day_order": 2, "leg_km": 0.7}
+    cases = [(section, section, _fake_rows(section, 1000)) for section in MEMORY_ROWS]
+    cases.append(("activities+geo", "activities", [{**row, **geo} for row in _fake_rows("activities", 1000)]))
+    for label, section, rows in cases:
+        sizes = []
+        for build in (lambda: [dict(row) for row in rows], lambda: [from_dict(section, row) for row in rows]):
+            tracemalloc.start()
+            items = build()
+            sizes.append(tracemalloc.get_traced_memory()[0] / len(items))
+            tracemalloc.stop()
+            del items
+        print(f"  {label:<15} dict {sizes[0]:5.0f} | registro {sizes[1]:5.0f}")
+
+    # Mesmos itens serializados como no checkpointer (msgpack do JsonPlusSerializer)
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+    from app.checkpoints import CHECKPOINT_TYPES
+    serde = JsonPlusSerializer(allowed_msgpack_modules=CHECKPOINT_TYPES)
+    print("Bytes por item no checkpoint (msgpack, 1000 itens):")
+    for label, section, rows in cases:
+        sizes = [len(serde.dumps_typed(items)[1]) / len(items) for items in (rows, [from_dict(section, row) for row in rows])]
+        print(f"  {label:<15} dict {sizes[0]:5.0f} | registro {sizes[1]:5.0f}")
+
+    # 2. Planos completos simultâneos (checkpoints ligados, caches de nó e do LLM desligados),
+    #    cada nível num processo limpo para o pico de RSS não vazar entre as medições
+    print(f"Planos simultâneos ({MEMORY_ROWS['flights']} voos, {MEMORY_ROWS['hotels']} hotéis, "
+          f"{MEMORY_ROWS['activities']} atividades por plano; LLM stub):")
+    env = {**os.environ, "LLM_BACKEND": "stub", "LLM_CACHE_ENABLED": "false", "NODE_CACHE_ENABLED": "false",
+           "PREFETCH_ENABLED": "false", "GEOAPIFY_API_KEY": ""}
+    for concurrency in levels:
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "_memory_worker", str(concurrency)],
+                              cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"  {concurrency:>3} planos: falhou\n{proc.stderr[-2000:]}")
+            continue
+        baseline_kb, peak_kb, elapsed = proc.stdout.split()[-3:]
+        delta_mb = (int(peak_kb) - int(baseline_kb)) / 1024
+        print(f"  {concurrency:>3} planos: RSS base {int(baseline_kb) / 1024:7.1f} MB | pico +{delta_mb:6.1f} MB "
+              f"| {delta_mb * 1024 / concurrency:7.1f} KB por plano | {float(elapsed):.2f} s")
+    print()
+
+SECTIONS = {
+    "import": bench_import,
+    "serialization": bench_serialization,
+    "memory": bench_memory,
+}
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["_memory_worker"]:
+        _memory_worker(int(sys.argv[2]))
+        sys.exit(0)
+    selected = sys.argv[1:] or list(SECTIONS)
+    for section in selected:
+        if section not in SECTIONS:
+            print(f"Seção desconhecida: {section}. Opções: {', '.join(SECTIONS)}")
+            sys.exit(1)
+        SECTIONS[section]()
@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+# Banco temporário e LLM stub: os testes não tocam o travel_app.db nem chamam APIs externas.
+# Definidos antes de qualquer import do app (database.py lê DATABASE_URL no import).
+_tmpdir = tempfile.mkdtemp(prefix="travel_app_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'test.db')}"
+os.environ["LLM_BACKEND"] = "stub"
+os.environ.setdefault("SERPAPI_API_KEY", "test")
+os.environ.setdefault("TAVILY_API_KEY", "test")
+os.environ.setdefault("GEOAPIFY_API_KEY", "test")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,67 @@
+from datetime import date, timedelta
+
+import pytest
+import requests
+from fastapi.testclient import TestClient
+
+from app.cache import get_price_cache
+from app.tools import flight_tools
+
+DEPARTURE = (date.today() + timedelta(days=60)).isoformat()
+RETURN = (date.today() + timedelta(days=65)).isoformat()
+
+@pytest.fixture
+def calendar_api(monkeypatch):
+    """IATA fixo e preço por célula controlado pelo teste; sem SerpAPI/Tavily."""
+    get_price_cache().clear()
+    monkeypatch.setattr(flight_tools, "_get_iata_code", lambda city: {"São Paulo": "GRU", "Curitiba": "CWB"}[city])
+    calls = []
+
+    def fake_cell(origin, destination, departure, return_, passengers, api_key):
+        calls.append((departure, return_))
+        if (departure, return_) == (DEPARTURE, RETURN):
+            raise requests.ConnectionError("conexão recusada")
+        return 1000.0
+
+    monkeypatch.setattr(flight_tools, "_calendar_cell_price", fake_cell)
+    yield calls
+    get_price_cache().clear()
+
+def _invoke(**overrides):
+    args = {"origin": "São Paulo", "destination": "Curitiba", "departure_date": DEPARTURE,
+            "return_date": RETURN, "flex_days": 1, "max_queries": 20}
+    return flight_tools.search_flight_price_calendar.invoke({**args, **overrides})
+
+def test_failed_cell_keeps_partial_matrix(calendar_api):
+    calendar = _invoke()
+
+    assert len(calendar_api) == 9 # 3x3 células, todas no futuro e com retorno após a partida
+    assert calendar["failed"] == 1
+    assert calendar["failed_cells"] == [{"departure_date": DEPARTURE, "return_date": RETURN}]
+    center = calendar["departure_dates"].index(DEPARTURE), calendar["return_dates"].index(RETURN)
+    assert calendar["prices"][center[0]][center[1]] is None
+    priced = [price for row in calendar["prices"] for price in row if price is not None]
+    assert priced == [1000.0] * 8
+
+def test_failed_cell_is_not_cached(calendar_api):
+    _invoke()
+    calendar_api.clear()
+    calendar = _invoke()
+
+    # Só a célula com falha é consultada de novo; as demais vêm do cache
+    assert calendar_api == [(DEPARTURE, RETURN)]
+    assert calendar["cached"] == 8
+    assert calendar["failed"] == 1
+
+def test_endpoint_returns_partial_matrix_on_provider_error(calendar_api):
+    from app.main import api
+
+    response = TestClient(api).post("/flights/calendar", json={
+        "origin": "São Paulo", "destination": "Curitiba",
+        "departure_date": DEPARTURE, "return_date": RETURN, "flex_days": 1,
+    })
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["failed"] == 1
+    assert sum(price is not None for row in body["prices"] for price in row) == 8
@@ -0,0 +1,38 @@
+import pytest
+
+from app.refine import refine_items
+from app.tools import hotel_tools
+
+CHECK_IN, CHECK_OUT = "2026-11-05", "2026-11-10" # 5 noites
+
+PROPERTIES = [
+    {"name": "Hotel Diária", "rate_per_night": {"lowest": "R$ 400", "extracted_lowest": 400}},
+    # Só o total da estadia: R$ 1.500 / 5 noites = R$ 300 por noite
+    {"name": "Hotel Total", "total_rate": {"lowest": "R$ 1.500", "extracted_lowest": 1500}},
+]
+
+@pytest.fixture
+def hotels(monkeypatch):
+    monkeypatch.setattr(hotel_tools, "serpapi_get_dict", lambda provider, params: {"properties": PROPERTIES})
+
+    class NoImage:
+        def invoke(self, args):
+            return None
+
+    monkeypatch.setattr(hotel_tools, "search_image", NoImage())
+    return hotel_tools.search_hotels.invoke({"destination": "Curitiba", "check_in_date": CHECK_IN, "check_out_date": CHECK_OUT})
+
+def test_total_rate_only_is_normalized_to_nightly(hotels):
+    by_name = {hotel.name: hotel for hotel in hotels}
+    assert by_name["Hotel Diária"].price_value == 400.0
+    assert by_name["Hotel Total"].price_value == 300.0
+    assert by_name["Hotel Total"].price == "R$ 1.500 (total da estadia)"
+
+def test_price_filter_and_sort_compare_nightly_rates(hotels):
+    assert [h.name for h in refine_items(hotels, {"sort_by": "price"})] == ["Hotel Total", "Hotel Diária"]
+    assert [h.name for h in refine_items(hotels, {"max_price": 350})] == ["Hotel Total"]
+
+def test_nightly_price_fallbacks():
+    assert hotel_tools._nightly_price({"rate_per_night": {"extracted_lowest": 250}}, 3) == ("R$ 250", 250.0)
+    assert hotel_tools._nightly_price({"price": "R$ 320 por noite, R$ 960 total"}, 3) == ("R$ 320 por noite, R$ 960", 320.0)
+    assert hotel_tools._nightly_price({}, 3) == ("Verificar no site", None)
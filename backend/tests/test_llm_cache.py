@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.output_parsers import PydanticOutputParser
+from pydantic import BaseModel
+
+from app import llm
+from app.database import init_db
+from app.llm_cache import invoke_cached, llm_cache_stats
+
+class Answer(BaseModel):
+    model: str
+
+class TierBackend:
+    """Cliente falso por tier; o tier strong pode ser travado para estourar o prazo."""
+
+    def __init__(self, config, release: threading.Event, calls: list):
+        self.config, self.release, self.calls = config, release, calls
+
+    def invoke(self, prompt):
+        self.calls.append(self.config.model)
+        if self.config.model == "strong-model" and not self.release.is_set():
+            self.release.wait(2)
+        return AIMessage(content=Answer(model=self.config.model).model_dump_json())
+
+@pytest.fixture
+def tiers(monkeypatch):
+    init_db()
+    release, calls = threading.Event(), []
+    llm.register_backend("tiers-test", lambda config: TierBackend(config, release, calls))
+    monkeypatch.setenv("LLM_BACKEND", "tiers-test")
+    monkeypatch.setenv("LLM_STRONG_MODEL", "strong-model")
+    monkeypatch.setenv("LLM_LIGHT_MODEL", "light-model")
+    monkeypatch.setenv("LLM_STRONG_TIMEOUT_SECONDS", "0.2")
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "true")
+    yield release, calls
+    release.set()
+    llm._BACKENDS.pop("tiers-test")
+    llm.get_client.cache_clear()
+
+def _curate(prompt: str) -> Answer:
+    return invoke_cached("curation", llm.get_llm("curation"), PydanticOutputParser(pydantic_object=Answer), prompt)
+
+def test_fallback_response_is_not_cached(tiers):
+    release, calls = tiers
+    prompt = "curadoria com fallback"
+    before = llm_cache_stats()["call_sites"]["curation"]["fallback_not_stored"]
+
+    assert _curate(prompt).model == "light-model" # strong estourou o prazo
+    assert llm_cache_stats()["call_sites"]["curation"]["fallback_not_stored"] == before + 1
+
+    # Sem entrada do fallback em cache: a próxima chamada tenta o modelo configurado de novo
+    release.set()
+    calls.clear()
+    assert _curate(prompt).model == "strong-model"
+    assert calls == ["strong-model"]
+
+    # A resposta do modelo configurado é gravada e reaproveitada
+    calls.clear()
+    assert _curate(prompt).model == "strong-model"
+    assert calls == []
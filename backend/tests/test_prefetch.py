@@ -0,0 +1,48 @@
+import pytest
+
+from app.cache import get_node_cache
+from app.langgraph_app import activity_agent_node
+from app.prefetch import Prefetcher
+from app.records import Activity
+from app.tools import activity_tools, flight_tools
+
+DESTINATION = "Curitiba"
+STATE = {"destination": DESTINATION, "start_date": "2026-11-05", "end_date": "2026-11-10", "error": None}
+
+@pytest.fixture
+def prefetcher(monkeypatch):
+    """Prefetcher com um destino popular e buscas falsas (sem banco de relatórios nem APIs)."""
+    get_node_cache().clear()
+    monkeypatch.setattr(flight_tools, "_get_iata_code", lambda city: "CWB")
+    monkeypatch.setattr(activity_tools, "_get_city_coordinates", lambda city, key: {"lat": -25.4, "lon": -49.2})
+    monkeypatch.setattr(activity_tools, "find_activities", lambda destination: (
+        [Activity(id="a1", title="Jardim Botânico", description="", duration="N/A", price="", capacity="Tourism")], []))
+    instance = Prefetcher()
+    monkeypatch.setattr(instance, "popular_targets", lambda: {
+        "destinations": [{"destination": DESTINATION, "count": 3}], "routes": [], "trips": []})
+    yield instance
+    get_node_cache().clear()
+
+def test_key_cached_by_user_request_is_not_a_warm_hit(prefetcher):
+    activity_agent_node(STATE) # pedido de usuário preenche o cache antes do ciclo
+
+    cycle = prefetcher.run_once()
+    assert cycle["already_warm"] == 1
+    assert cycle["searches"] == 0
+
+    activity_agent_node(STATE) # acerto de cache, mas a entrada não veio do prefetch
+    report = prefetcher.report()
+    assert report["warmed_keys"] == 0
+    assert report["hot_lookups"] == {"activities": 2}
+    assert report["warm_hits"] == {}
+    assert report["warm_hit_rate"] == 0.0
+
+def test_key_computed_by_prefetcher_is_a_warm_hit(prefetcher):
+    cycle = prefetcher.run_once()
+    assert cycle["searches"] == 1
+
+    activity_agent_node(STATE)
+    report = prefetcher.report()
+    assert report["warmed_keys"] == 1
+    assert report["warm_hits"] == {"activities": 1}
+    assert report["warm_hit_rate"] == 1.0
@@ -152,6 +152,7 @@ const SearchResults = () => {
 
     try {
         await saveReport({
+            origin: apiResponse.origin,
             destination: apiResponse.destination || destination || "Destino Desconhecido",
             start_date: apiResponse.start_date || checkIn || "",
             end_date: apiResponse.end_date || checkOut || "",
@@ -9,6 +9,8 @@ export interface ApiFlight {
   price: string;    
   stops: number;    
   image_url: string | null;
+  price_value?: number | null;
+  duration_minutes?: number | null;
 }
 
 export interface ApiHotel {
@@ -19,6 +21,9 @@ export interface ApiHotel {
   price: string;    
   amenities: string[];
   image_url: string | null;
+  price_value?: number | null;
+  rating_value?: number | null;
+  stars?: number | null;
 }
 
 export interface ApiActivity {
@@ -29,6 +34,15 @@ export interface ApiActivity {
   price: string;      
   capacity: string;   
   image_url: string | null;
+  // Preenchidos pela etapa geoespacial quando o local tem coordenadas
+  lat?: number | null;
+  lon?: number | null;
+  distance_to_center_km?: number;
+  nearest_hotel_id?: string;
+  nearest_hotel_km?: number;
+  day?: number;
+  day_order?: number;
+  leg_km?: number;
 }
 
 // --- DEFINIÇÕES DO RELATÓRIO CURADO ---
@@ -48,10 +62,85 @@ export interface FinalReport {
 
 export interface TripDataResponse {
   final_report: FinalReport | null;
+  origin: string | null;
   destination: string | null;
   start_date: string | null;
   end_date: string | null;
   error: string | null;
+  run_id: string | null;
+  resumable: boolean;
+  degraded_sections: DegradedSection[];
+  price_calendar: PriceCalendar | null;
+  itinerary: Itinerary | null;
+}
+
+// Roteiro montado pela etapa geoespacial: atividades agrupadas por dia e por proximidade
+export interface ItineraryDay {
+  day: number;
+  date: string | null;
+  activity_ids: string[];
+  activity_titles: string[];
+  route_km: number;
+  distance_to_center_km: number;
+}
+
+export interface Itinerary {
+  days: ItineraryDay[];
+  hotels: { id: string; name: string; avg_km_to_activities: number; distance_to_center_km: number }[];
+  unplaced: string[];
+}
+
+// Matriz de preços (partida x retorno) consultada com datas flexíveis
+export interface PriceCalendar {
+  origin: string;
+  destination: string;
+  departure_dates: string[];
+  return_dates: string[];
+  prices: (number | null)[][];
+  cheapest: { departure_date: string; return_date: string; price: number }[];
+  queried: number;
+  cached: number;
+  skipped: number;
+}
+
+// Seção do relatório sem dados porque o provedor estava lento ou fora do ar
+export interface DegradedSection {
+  section: "flights" | "hotels" | "activities";
+  provider: string;
+  reason: string;
+  message: string;
+}
+
+// --- REFINAMENTO (filtros sobre os resultados brutos de uma execução) ---
+
+export interface RefineCriteria {
+  min_price?: number;
+  max_price?: number;
+  max_stops?: number;
+  max_duration_minutes?: number;
+  min_rating?: number;
+  min_stars?: number;
+  categories?: string[];
+  sort_by?: "price" | "duration" | "rating" | "stars" | "stops";
+  descending?: boolean;
+  limit?: number;
+}
+
+export interface RefineRequest {
+  flights?: RefineCriteria;
+  hotels?: RefineCriteria;
+  activities?: RefineCriteria;
+  recurate?: boolean;
+}
+
+export interface RefineResponse {
+  run_id: string;
+  flights: ApiFlight[];
+  hotels: ApiHotel[];
+  activities: ApiActivity[];
+  final_report: FinalReport | null;
+  elapsed_ms: number;
+  error: string | null;
 }
 
 // --- HELPER DE AUTH ---
@@ -63,13 +152,14 @@ const getAuthHeader = () => {
 // --- FUNÇÕES DA API ---
 
 // 1. Planejamento de Viagem (Público)
-export const planTrip = async (user_request: string): Promise<TripDataResponse> => {
+// Reenviar o run_id de uma resposta com `resumable: true` retoma a execução de onde parou
+export const planTrip = async (user_request: string, run_id?: string): Promise<TripDataResponse> => {
   const response = await fetch("http://127.0.0.1:8000/plan-trip", {
     method: "POST",
     headers: {
       "Content-Type": "application/json",
     },
-    body: JSON.stringify({ user_request }),
+    body: JSON.stringify({ user_request, run_id }),
   });
 
   if (!response.ok) {
@@ -81,6 +171,17 @@ export const planTrip = async (user_request: string): Promise<TripDataResponse>
   return response.json();
 };
 
+// 1b. Refinar uma execução anterior (filtros/ordenação sem refazer o planejamento)
+export const refineTrip = async (run_id: string, refine: RefineRequest): Promise<RefineResponse> => {
+  const response = await fetch(`http://127.0.0.1:8000/plan-trip/${run_id}/refine`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(refine),
+  });
+  if (!response.ok) throw new Error("Falha ao refinar a viagem");
+  return response.json();
+};
+
 // 2. Login
 export const loginUser = async (email: string, password: string) => {
   const formData = new FormData();
@@ -107,7 +208,7 @@ export const registerUser = async (email: string, password: string) => {
 };
 
 // 4. Salvar Relatório
-export const saveReport = async (data: { destination: string, start_date: string, end_date: string, content: FinalReport }) => {
+export const saveReport = async (data: { origin?: string | null, destination: string, start_date: string, end_date: string, content: FinalReport }) => {
   const response = await fetch("http://127.0.0.1:8000/reports", {
     method: "POST",
     headers: { 